@@ -10,11 +10,48 @@ def create_app(config_name=None):
     else:
         app.config.from_object(Config)
 
+    from app.db_pool import init_app as init_db_pool
+    init_db_pool(app)
+    from app.replicas import init_app as init_replicas
+    init_replicas(app)
     db.init_app(app)
 
-    from app.auth import auth
+    from app.json_provider import init_app as init_json
+    init_json(app)
+
+    from app.middleware import init_app as init_middleware
+    init_middleware(app)
+
+    from app.pagination import init_app as init_pagination
+    init_pagination(app)
+
+    from app.suggest import init_app as init_suggest
+    init_suggest(app)
+
+    from app import recommender
+    recommender.init_app(app)
+
+    from app.auth import auth, init_app as init_auth
     from app.routes import main
     app.register_blueprint(auth)
     app.register_blueprint(main)
+
+    # Profile cache, and Microsoft's signing keys fetched before the first login callback needs them
+    init_auth(app)
+
+    from app.batch import register_commands
+    register_commands(app)
+
+    from app.catalog_import import register_commands as register_import_commands
+    register_import_commands(app)
+
+    from app.ingest import register_commands as register_ingest_commands
+    register_ingest_commands(app)
+
+    from app.tmdb_sync import register_commands as register_sync_commands
+    register_sync_commands(app)
+
+    from app.ratings import register_commands as register_rating_commands
+    register_rating_commands(app)
     
     return app
\ No newline at end of file
@@ -1,4 +1,7 @@
 from flask import Blueprint, jsonify, request, current_app, make_response
+import hashlib
+import logging
+import threading
 import requests
 from urllib.parse import urlencode
 import secrets
@@ -6,17 +9,22 @@ import jwt
 from datetime import datetime
 from .middleware import validate_tokens
 from .extensions import db
-from app.models import User, UserMoviesWatched, UserBooksRead
+from app.models import User, UserMoviesWatched, UserBooksRead, UserRecommendations
 from app.middleware import user_required
+from app.replicas import read_only
+from app.cache import LRUCache, SingleFlightValue
+from app.recommender import invalidate_user_recommendations
+from app.pagination import invalidate_user_counts
+from app.versions import user_scope, bump_versions
 from jwt.algorithms import RSAAlgorithm
 
 # Create a Flask blueprint for authentication routes
 auth = Blueprint('auth', __name__)
 
-def get_microsoft_signing_keys():
+def fetch_microsoft_signing_keys():
     """
     Fetch Microsoft's signing keys from their OpenID Connect configuration.
-    Results are cached to avoid repeated requests.
+    Makes two HTTP requests; use get_microsoft_signing_keys for the cached keys.
     """
     # Retrieve the JWKS (JSON Web Key Set) URI from Microsoft's OpenID configuration
     openid_config_url = "https://login.microsoftonline.com/common/v2.0/.well-known/openid-configuration"
@@ -28,40 +36,95 @@ def get_microsoft_signing_keys():
     # Convert JWKS keys to RSA algorithms for token verification
     return {jwk['kid']: RSAAlgorithm.from_jwk(jwk) for jwk in jwks['keys']}
 
-def verify_token_signature(id_token):
+# Process-wide signing key cache; concurrent refreshes share a single fetch
+signing_key_cache = SingleFlightValue(fetch_microsoft_signing_keys, ttl=86400, min_refresh_interval=300)
+
+def init_app(app):
+    """Set up the authentication caches for an application."""
+    init_signing_key_cache(app)
+
+    # Short-lived Graph profiles keyed by access token digest, one cache per app
+    app.extensions['profile_cache'] = LRUCache(
+        max_size=app.config['PROFILE_CACHE_SIZE'],
+        ttl=app.config['PROFILE_CACHE_TTL']
+    )
+
+def init_signing_key_cache(app):
+    """Configure the signing key cache and warm it in the background at startup."""
+    signing_key_cache.ttl = app.config['JWKS_CACHE_TTL']
+    signing_key_cache.min_refresh_interval = app.config['JWKS_MIN_REFRESH_INTERVAL']
+
+    if app.config['JWKS_WARM_ON_STARTUP']:
+        # Warm without blocking startup when Microsoft is slow or unreachable
+        threading.Thread(target=warm_signing_key_cache, name='jwks-warmup', daemon=True).start()
+
+def warm_signing_key_cache():
+    """Load the signing keys ahead of the first login callback."""
+    try:
+        get_microsoft_signing_keys()
+    except requests.RequestException as e:
+        logging.warning(f"Could not warm signing key cache: {str(e)}")
+
+def get_microsoft_signing_keys():
+    """
+    Get Microsoft's signing keys.
+    Results are cached for JWKS_CACHE_TTL seconds to avoid repeated requests.
+    """
+    return signing_key_cache.get()
+
+def refresh_microsoft_signing_keys():
+    """
+    Force a refresh of the signing keys, e.g. when a token names an unknown key ID.
+    Refreshes are rate-limited, and a failed refresh keeps the current keys.
+    """
+    try:
+        return signing_key_cache.get(force_refresh=True)
+    except requests.RequestException as e:
+        logging.warning(f"Could not refresh signing keys: {str(e)}")
+        return {}
+
+def verify_token_signature(id_token, audience=None):
     """
     Verify the signature of a Microsoft ID token.
+    When audience is given, the token must also have been issued to that client ID.
     Returns (decoded_token, error_message)
     """
     try:
         # Extract the unverified header to find the key ID used for signing
         header = jwt.get_unverified_header(id_token)
-        kid = header['kid']
+        kid = header.get('kid')
+        if not kid:
+            return None, "Missing key ID in token"
         
         # Retrieve cached signing keys
         signing_keys = get_microsoft_signing_keys()
         
+        # Microsoft may have rotated keys since the cache was filled
+        if kid not in signing_keys:
+            signing_keys = refresh_microsoft_signing_keys()
+
         # Validate the key ID exists in the keys
         if kid not in signing_keys:
             return None, "Invalid key ID in token"
             
-        # Decode and verify the token's signature using the correct RSA key
-        # Note: Only signature verification is enabled, other validations are skipped
+        # Decode and verify the token's signature (and audience, if given) using the correct RSA key
+        # Note: Expiry and issuer are not checked here
         decoded = jwt.decode(
             id_token,
             key=signing_keys[kid],
             algorithms=['RS256'],
+            audience=audience,
             options={
                 "verify_signature": True,
-                "verify_exp": False,  # We're only verifying signature
-                "verify_aud": False,
+                "verify_exp": False,  # The middleware enforces expiry itself
+                "verify_aud": audience is not None,
                 "verify_iss": False
             }
         )
         
         return decoded, None
         
-    except jwt.InvalidTokenError as e:
+    except jwt.PyJWTError as e:
         # Handle invalid token errors
         return None, str(e)
     except requests.RequestException as e:
@@ -122,6 +185,45 @@ def get_user_info(access_token):
     response = requests.get('https://graph.microsoft.com/v1.0/me', headers=headers)
     return response.json()
 
+def profile_cache_key(access_token):
+    """Digest of an access token, so raw tokens are never held as cache keys."""
+    return hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+
+def cache_user_profile(access_token, user_info):
+    """Remember the display name and email Graph returned for an access token."""
+    # Never cache Graph error payloads
+    if 'error' in user_info:
+        return
+    current_app.extensions['profile_cache'].set(profile_cache_key(access_token), {
+        'displayName': user_info.get('displayName'),
+        'email': user_info.get('mail') or user_info.get('userPrincipalName')
+    })
+
+def get_user_profile(access_token, refresh=False, email=None):
+    """
+    Get the display name and email for an access token.
+    On a cache miss the display name stored for email at sign-in is used, so Microsoft Graph
+    is only called for users without one or when a refresh is requested.
+    """
+    cache = current_app.extensions['profile_cache']
+    key = profile_cache_key(access_token)
+
+    profile = None if refresh else cache.get(key)
+    if profile is None and not refresh and email:
+        # The profile cache is per process; the stored name is shared by every worker
+        display_name = db.session.query(User.display_name).filter_by(email=email).scalar()
+        if display_name:
+            profile = {'displayName': display_name, 'email': email}
+            cache.set(key, profile)
+    if profile is None:
+        user_info = get_user_info(access_token)
+        cache_user_profile(access_token, user_info)
+        profile = {
+            'displayName': user_info.get('displayName'),
+            'email': user_info.get('mail') or user_info.get('userPrincipalName')
+        }
+    return profile
+
 def get_token_expiry(id_token):
     """Get token expiration time from id_token"""
     # Decode token without signature verification to get expiration timestamp
@@ -188,6 +290,14 @@ def callback():
         db.session.add(user)
         db.session.commit()
         is_new_user = True
+
+    # Keep the stored display name in sync with the Microsoft profile
+    elif user_info.get('displayName') and user.display_name != user_info.get('displayName'):
+        user.display_name = user_info.get('displayName')
+        db.session.commit()
+
+    # Seed the profile cache so /api/auth/user does not call Graph again for this token
+    cache_user_profile(token_response['access_token'], user_info)
     
     # Decode ID token to check roles
     decoded = jwt.decode(token_response['id_token'], options={"verify_signature": False})
@@ -237,9 +347,11 @@ def get_user():
     if error:
         return jsonify({'error': error}), 401
     
-    # Fetch user info from Microsoft Graph
-    user_info = get_user_info(request.access_token)
-    email = user_info.get('mail') or user_info.get('userPrincipalName')
+    # Resolve the profile from cache or the stored display name, calling Microsoft Graph
+    # only for users without one or on ?refresh=true
+    refresh = request.args.get('refresh', 'false').lower() == 'true'
+    profile = get_user_profile(request.access_token, refresh=refresh, email=decoded.get('email'))
+    email = profile['email']
     
     # Retrieve user from database
     user = User.query.filter_by(email=email).first()
@@ -252,7 +364,7 @@ def get_user():
     
     return jsonify({
         'user': {
-            'displayName': user_info.get('displayName'),
+            'displayName': profile['displayName'],
             'email': email,
             'role': 'admin' if is_admin else 'user',
             'onboardingCompleted': onboarding_completed,
@@ -265,6 +377,12 @@ def logout():
     """Logout user"""
     # Create response and delete authentication cookies
     response = make_response(jsonify({'message': 'Logged out successfully'}))
+
+    # Forget the cached profile for this session's access token
+    access_token = request.cookies.get('access_token')
+    if access_token:
+        current_app.extensions['profile_cache'].delete(profile_cache_key(access_token))
+
     response.delete_cookie('id_token')
     response.delete_cookie('access_token')
     return response
@@ -272,6 +390,7 @@ def logout():
 
 @auth.route('/api/auth/onboarding-status', methods=['GET'])
 @user_required
+@read_only
 def get_onboarding_status():
     """Get user's onboarding status and progress"""
     # Extract user email from token
@@ -281,15 +400,12 @@ def get_onboarding_status():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    # Count movies and books rated by the user
-    movies_count = UserMoviesWatched.query.filter_by(email=email).count()
-    books_count = UserBooksRead.query.filter_by(email=email).count()
-    
+    # Movies and books rated by the user, counted as ratings are written
     return jsonify({
         'onboardingCompleted': user.onboarding_completed,
         'progress': {
-            'movies': movies_count,
-            'books': books_count,
+            'movies': user.movies_rated,
+            'books': user.books_rated,
             'required': {
                 'movies': 3,
                 'books': 3
@@ -309,10 +425,7 @@ def complete_onboarding():
         return jsonify({'error': 'User not found'}), 404
 
     # Verify user has rated required number of items
-    movies_count = UserMoviesWatched.query.filter_by(email=email).count()
-    books_count = UserBooksRead.query.filter_by(email=email).count()
-    
-    if movies_count < 3 or books_count < 3:
+    if user.movies_rated < 3 or user.books_rated < 3:
         return jsonify({
             'error': 'Must rate at least 3 movies and 3 books before completing onboarding'
         }), 400
@@ -372,12 +485,16 @@ def delete_account():
         
         # Delete associated data (ON DELETE CASCADE will handle most deletions)
         # Explicitly delete for clarity
-        UserMoviesWatched.query.filter_by(email=email).delete()
-        UserBooksRead.query.filter_by(email=email).delete()
+        UserMoviesWatched.query.filter_by(user_id=user.id).delete()
+        UserBooksRead.query.filter_by(user_id=user.id).delete()
+        UserRecommendations.query.filter_by(email=email).delete()
         
         # Delete user record
         db.session.delete(user)
         db.session.commit()
+        invalidate_user_recommendations(email)
+        invalidate_user_counts(email)
+        bump_versions(user_scope(email))
         
         # Create response and clear authentication cookies
         response = make_response(jsonify({
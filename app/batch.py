@@ -0,0 +1,135 @@
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import click
+
+from app.extensions import db
+from app.llm import get_openai_client, get_llm_recommendations
+from app.models import User, UserRecommendations
+from app.recommender import precompute_fingerprint, recommend_for_user, merge_recommendations
+
+# Recommendation types precomputed for every user
+REC_TYPES = ('all', 'movie', 'book')
+
+
+def get_precomputed_recommendations(user_email, tab_type, engine, user_items, user_age):
+    """
+    Return the stored recommendations for a user if they are still current.
+
+    A stored list is current when it was produced by the same engine from the
+    same rating history and age bucket the user has now.
+
+    Returns:
+    - List of recommendation dictionaries, or None if nothing usable is stored
+    """
+    row = UserRecommendations.query.filter_by(email=user_email, rec_type=tab_type).first()
+    if row is None or row.engine != engine:
+        return None
+    if row.history_hash != precompute_fingerprint(user_items, user_age):
+        return None
+    return json.loads(row.recommendations)
+
+
+def generate_for_user(user_email, tab_type, engine, top_n, config):
+    """
+    Generate and store recommendations for one user and type if their history changed.
+
+    Must run inside an application context.
+
+    Returns:
+    - 'refreshed', 'unchanged' or 'empty'
+    """
+    from app.routes import get_user_items
+
+    user_items, user_age = get_user_items(user_email, tab_type)
+    if not user_items:
+        return 'empty'
+
+    fingerprint = precompute_fingerprint(user_items, user_age)
+    row = UserRecommendations.query.filter_by(email=user_email, rec_type=tab_type).first()
+    if row is not None and row.history_hash == fingerprint and row.engine == engine:
+        return 'unchanged'
+
+    recommendations = []
+    if engine in ['local', 'hybrid']:
+        recommendations = recommend_for_user(
+            user_email,
+            tab_type,
+            limit=top_n,
+            max_age=config['RECOMMENDER_MODEL_TTL'],
+            neighbors=config['RECOMMENDER_NEIGHBORS']
+        )
+    if engine != 'local' and len(recommendations) < top_n:
+        client = get_openai_client(timeout=config['OPENAI_TIMEOUT'], max_retries=config['OPENAI_MAX_RETRIES'])
+        llm_items = get_llm_recommendations(client, user_items, user_age, tab_type)
+        recommendations = merge_recommendations(recommendations, llm_items, limit=top_n)
+
+    if row is None:
+        row = UserRecommendations(email=user_email, rec_type=tab_type)
+        db.session.add(row)
+    row.engine = engine
+    row.history_hash = fingerprint
+    row.recommendations = json.dumps(recommendations[:top_n], default=str)
+    row.generated_at = datetime.utcnow()
+    db.session.commit()
+    return 'refreshed'
+
+
+def precompute_recommendations(app, engine=None, top_n=10, concurrency=4, rec_types=REC_TYPES):
+    """
+    Walk all onboarded users and refresh their stored recommendations.
+
+    Work is spread over a bounded thread pool; each job runs in its own
+    application context and therefore its own database session.
+
+    Args:
+    - app: Flask application
+    - engine: Recommendation engine, defaults to RECOMMENDER_ENGINE
+    - top_n: Number of recommendations stored per user and type
+    - concurrency: Maximum number of users processed at once
+    - rec_types: Recommendation types to precompute
+
+    Returns:
+    - Dictionary counting the outcome of every (user, type) job
+    """
+    engine = engine or app.config['RECOMMENDER_ENGINE']
+
+    with app.app_context():
+        emails = [email for (email,) in db.session.query(User.email).filter(User.onboarding_completed.is_(True))]
+
+    def run(user_email, tab_type):
+        with app.app_context():
+            try:
+                return generate_for_user(user_email, tab_type, engine, top_n, app.config)
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Error precomputing {tab_type} recommendations for {user_email}: {str(e)}")
+                return 'failed'
+
+    started = time.time()
+    summary = {'refreshed': 0, 'unchanged': 0, 'empty': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(run, email, tab_type) for email in emails for tab_type in rec_types]
+        for future in as_completed(futures):
+            summary[future.result()] += 1
+
+    logging.info("Precomputed recommendations for %s users in %.1f s: %s",
+                 len(emails), time.time() - started, summary)
+    return summary
+
+
+def register_commands(app):
+    """Register the batch job as a Flask CLI command."""
+
+    @app.cli.command('precompute-recommendations')
+    @click.option('--engine', type=click.Choice(['local', 'llm', 'hybrid']), default=None,
+                  help='Recommendation engine (defaults to RECOMMENDER_ENGINE).')
+    @click.option('--top-n', default=10, show_default=True, help='Recommendations stored per user and type.')
+    @click.option('--concurrency', default=4, show_default=True, help='Users processed in parallel.')
+    def precompute_recommendations_command(engine, top_n, concurrency):
+        """Refresh stored recommendations for users whose ratings changed."""
+        summary = precompute_recommendations(app, engine=engine, top_n=top_n, concurrency=concurrency)
+        click.echo(json.dumps(summary))
@@ -0,0 +1,69 @@
+from itertools import islice
+
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app.extensions import db
+
+# Dialect-specific INSERT constructs that support upserts
+_UPSERT_INSERTS = {
+    'mysql': mysql.insert,
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def chunked(iterable, size):
+    """Yield lists of up to size items from iterable without materializing it."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def upsert_rows(model, rows, update_columns=None, conflict_columns=None):
+    """
+    Insert rows with one multi-row statement, updating rows whose key already exists.
+
+    Uses INSERT ... ON DUPLICATE KEY UPDATE on MySQL and INSERT ... ON CONFLICT
+    DO UPDATE on SQLite/PostgreSQL. Does not commit.
+
+    Args:
+    - model: Model class of the target table
+    - rows: List of dictionaries keyed by column name, all with the same keys
+    - update_columns: Columns overwritten on conflict, defaults to every non-key column in rows
+    - conflict_columns: Unique columns identifying a row, defaults to the primary key
+      (only used by ON CONFLICT; MySQL checks every unique key)
+
+    Returns:
+    - Row count reported by the database; without update columns this is the
+      number of rows inserted (MySQL counts an updated row twice)
+    """
+    if not rows:
+        return 0
+
+    table = model.__table__
+    if conflict_columns is None:
+        conflict_columns = [column.name for column in table.primary_key.columns]
+    if update_columns is None:
+        update_columns = [name for name in rows[0] if name not in conflict_columns]
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in _UPSERT_INSERTS:
+        raise NotImplementedError(f'Upserts are not supported on {dialect}')
+
+    stmt = _UPSERT_INSERTS[dialect](table).values(rows)
+    if dialect == 'mysql':
+        if update_columns:
+            stmt = stmt.on_duplicate_key_update({name: stmt.inserted[name] for name in update_columns})
+        else:
+            stmt = stmt.prefix_with('IGNORE')
+    elif update_columns:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_={name: stmt.excluded[name] for name in update_columns}
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=conflict_columns)
+    return db.session.execute(stmt).rowcount
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache with optional per-entry expiry.
+
+    Keeps hit/miss counters so callers can report cache effectiveness.
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        # Maximum number of entries before the least recently used one is evicted
+        self.max_size = max_size
+
+        # Default lifetime of an entry in seconds, None keeps entries until evicted
+        self.ttl = ttl
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default when missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """
+        Store a value.
+
+        Args:
+        - key: Cache key
+        - value: Value to store
+        - ttl: Lifetime in seconds, overriding the cache default
+        - expires_at: Absolute epoch expiry, overriding ttl
+        """
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Remove a key if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Remove every key for which predicate(key) is true and return how many were removed."""
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return hit/miss statistics as a dictionary."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class SingleFlightValue:
+    """
+    Holds one lazily loaded value with a TTL.
+
+    Concurrent refreshes are collapsed into a single call to the loader: threads
+    that arrive while a refresh is running wait for it and reuse its result.
+    Forced refreshes are rate-limited so callers cannot hammer the source.
+    """
+
+    def __init__(self, loader, ttl=3600, min_refresh_interval=60):
+        # Callable producing a fresh value
+        self.loader = loader
+
+        # Seconds before the value is considered stale
+        self.ttl = ttl
+
+        # Minimum seconds between two forced refreshes
+        self.min_refresh_interval = min_refresh_interval
+
+        self._value = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, force_refresh=False):
+        """
+        Return the value, loading it when missing, stale or when a refresh is forced.
+
+        If a refresh fails but a previous value exists, the previous value is
+        kept and returned; with nothing to fall back on the error propagates.
+        """
+        value, loaded_at = self._value, self._loaded_at
+        if value is not None and not force_refresh and time.time() - loaded_at < self.ttl:
+            return value
+
+        requested_at = time.time()
+        with self._lock:
+            if self._value is not None:
+                # Another thread finished a refresh while this one was waiting
+                if self._loaded_at >= requested_at:
+                    return self._value
+                age = time.time() - self._loaded_at
+                if not force_refresh and age < self.ttl:
+                    return self._value
+                if force_refresh and age < self.min_refresh_interval:
+                    return self._value
+
+            try:
+                value = self.loader()
+            except Exception:
+                if self._value is not None:
+                    return self._value
+                raise
+
+            self._value = value
+            self._loaded_at = time.time()
+            self.loads += 1
+            return value
+
+    def clear(self):
+        """Forget the current value so the next call loads it again."""
+        with self._lock:
+            self._value = None
+            self._loaded_at = None
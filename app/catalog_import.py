@@ -0,0 +1,240 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+
+from app.bulk import chunked, upsert_rows
+from app.extensions import db
+from app.facets import replace_movie_facets
+from app.models import Movies, Books
+from app.pagination import invalidate_catalog_counts
+from app.versions import CATALOG_SCOPE, bump_versions
+
+# Upload formats accepted by the importer
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+# Rejected records listed individually in an import summary; the rest are only counted
+MAX_REPORTED_REJECTS = 100
+
+
+def _required(record, field):
+    value = record.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise ValueError(f'Missing {field}')
+    return value.strip() if isinstance(value, str) else value
+
+
+def _optional(record, field):
+    value = record.get(field)
+    if isinstance(value, str):
+        value = value.strip()
+    return value or None
+
+
+def _check_lengths(model, row):
+    """Reject values that would not fit their column instead of letting the whole chunk fail."""
+    for column in model.__table__.columns:
+        length = getattr(column.type, 'length', None)
+        value = row.get(column.name)
+        if length and isinstance(value, str) and len(value) > length:
+            raise ValueError(f'{column.name} is longer than {length} characters')
+    return row
+
+
+# Movie columns covered by the content hash, in hashing order
+MOVIE_HASH_COLUMNS = ('id', 'title', 'release_date', 'original_language', 'genres', 'cast', 'director', 'poster_path')
+
+
+def movie_content_hash(row):
+    """Hash a movie's catalog columns, so an unchanged row can be recognized without comparing every field."""
+    values = ['' if row.get(name) is None else str(row[name]) for name in MOVIE_HASH_COLUMNS]
+    return hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def clean_movie(record):
+    """
+    Turn an uploaded record into a movies row, with the same rules as POST /api/movies.
+
+    Raises:
+    - ValueError describing the first problem with the record
+    """
+    release_date = _required(record, 'release_date')
+    if not hasattr(release_date, 'year'):
+        release_date = datetime.strptime(str(release_date), '%Y-%m-%d').date()
+    row = _check_lengths(Movies, {
+        'id': int(_required(record, 'id')),
+        'title': _required(record, 'title'),
+        'release_date': release_date,
+        'original_language': _required(record, 'original_language'),
+        'genres': _required(record, 'genres'),
+        'cast': _required(record, 'cast'),
+        'director': _required(record, 'director'),
+        'poster_path': _optional(record, 'poster_path'),
+    })
+    row['content_hash'] = movie_content_hash(row)
+    return row
+
+
+def clean_book(record):
+    """
+    Turn an uploaded record into a books row, with the same rules as POST /api/books.
+
+    Raises:
+    - ValueError describing the first problem with the record
+    """
+    isbn = str(_required(record, 'isbn'))
+    if not isbn.isdigit():
+        raise ValueError(f'ISBN {isbn} is not numeric')
+    year = str(_required(record, 'year_of_publication'))
+    if not year.isdigit() or len(year) > 4:
+        raise ValueError(f'Invalid year_of_publication {year}')
+    return _check_lengths(Books, {
+        'isbn': int(isbn),
+        'book_title': _required(record, 'book_title'),
+        'book_author': _required(record, 'book_author'),
+        'year_of_publication': int(year),
+        'image_url_s': _optional(record, 'image_url_s'),
+    })
+
+
+# Target model, row cleaner and key column per catalog section
+CATALOG_SECTIONS = {
+    'movies': (Movies, clean_movie, 'id'),
+    'books': (Books, clean_book, 'isbn'),
+}
+
+
+def iter_records(stream, fmt):
+    """
+    Yield (line number, record dictionary) pairs from a text stream, one at a time.
+
+    Args:
+    - stream: Text file object or other iterable of lines; only one line is held in memory at a time
+    - fmt: 'csv' (with a header row) or 'jsonl' (one JSON object per line)
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f'Invalid JSON: {str(e)}')
+            continue
+        yield line_number, record if isinstance(record, dict) else ValueError('Expected a JSON object')
+
+
+def refresh_catalog_caches(section):
+    """Bring caches derived from the catalog up to date after a bulk change to a section."""
+    invalidate_catalog_counts(section)
+    bump_versions(CATALOG_SCOPE)
+    current_app.extensions['title_index'].invalidate()
+
+
+def import_catalog(section, stream, fmt='csv', chunk_size=1000, on_progress=None, stop_on_error=False,
+                   line_offset=0):
+    """
+    Stream records into the movies or books table with chunked multi-row upserts.
+
+    Each chunk is cleaned, deduplicated by key (the last record wins), upserted
+    with one statement and committed, so memory stays bounded by the chunk size
+    and a failure only loses the chunk in flight. Must run inside an application context.
+
+    Args:
+    - section: 'movies' or 'books'
+    - stream: Text stream or iterable of lines of the upload
+    - fmt: 'csv' or 'jsonl'
+    - chunk_size: Records per upsert statement
+    - on_progress: Optional callable receiving the running summary after every chunk
+    - stop_on_error: Raise when a chunk cannot be written instead of rejecting it and moving on
+    - line_offset: Added to reported line numbers when the stream starts part-way through a file
+
+    Returns:
+    - Summary dictionary: processed, upserted, rejected counts and the first rejects
+    """
+    model, clean, key = CATALOG_SECTIONS[section]
+    summary = {'processed': 0, 'upserted': 0, 'rejected': 0, 'rejects': []}
+    started = time.time()
+
+    def reject(line_number, error):
+        summary['rejected'] += 1
+        if len(summary['rejects']) < MAX_REPORTED_REJECTS:
+            summary['rejects'].append({'line': line_number + line_offset, 'error': str(error)})
+
+    for chunk in chunked(iter_records(stream, fmt), chunk_size):
+        rows = {}
+        for line_number, record in chunk:
+            summary['processed'] += 1
+            if isinstance(record, Exception):
+                reject(line_number, record)
+                continue
+            try:
+                row = clean(record)
+            except (ValueError, TypeError) as e:
+                reject(line_number, e)
+                continue
+            rows[row[key]] = (line_number, row)
+
+        try:
+            chunk_rows = [row for _, row in rows.values()]
+            upsert_rows(model, chunk_rows)
+            if model is Movies:
+                replace_movie_facets(chunk_rows)
+            db.session.commit()
+            summary['upserted'] += len(rows)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error importing {section} chunk ending at line {chunk[-1][0]}: {str(e)}")
+            if stop_on_error:
+                raise
+            for line_number, _ in rows.values():
+                reject(line_number, f'Chunk failed: {str(e)}')
+
+        if on_progress:
+            on_progress(summary)
+
+    if summary['upserted']:
+        refresh_catalog_caches(section)
+
+    logging.info("Imported %s: %s processed, %s upserted, %s rejected in %.1f s", section,
+                 summary['processed'], summary['upserted'], summary['rejected'], time.time() - started)
+    return summary
+
+
+def detect_format(filename, content_type=None):
+    """Guess the upload format from a file name or content type."""
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in (content_type or '') or 'jsonl' in (content_type or ''):
+        return 'jsonl'
+    return 'csv'
+
+
+def register_commands(app):
+    """Register the catalog import as a Flask CLI command."""
+
+    @app.cli.command('import-catalog')
+    @click.argument('section', type=click.Choice(list(CATALOG_SECTIONS)))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None,
+                  help='Input format (defaults to the file extension).')
+    @click.option('--chunk-size', default=1000, show_default=True, help='Records per upsert statement.')
+    def import_catalog_command(section, path, fmt, chunk_size):
+        """Upsert movies or books from a CSV or JSONL file."""
+        def progress(summary):
+            click.echo(f"{summary['processed']} processed, {summary['upserted']} upserted, "
+                       f"{summary['rejected']} rejected", err=True)
+
+        with io.open(path, encoding='utf-8', newline='') as stream:
+            summary = import_catalog(section, stream, fmt or detect_format(path), chunk_size, progress)
+        click.echo(json.dumps(summary))
@@ -9,6 +9,28 @@ class Config:
     # SQLAlchemy
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool: connections kept open, extra connections allowed under load, seconds a request
+    # waits for a free connection, seconds before a connection is replaced (keep it below MySQL's
+    # wait_timeout) and whether a connection is tested before each checkout
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+    # Optional read replicas (comma-separated URLs) serving the SELECTs of read-only views, seconds
+    # between replica health checks, and seconds a user's reads stay on the primary after a rating write
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    REPLICA_HEALTH_CHECK_INTERVAL = int(os.getenv('REPLICA_HEALTH_CHECK_INTERVAL', 30))
+    READ_YOUR_WRITES_WINDOW = int(os.getenv('READ_YOUR_WRITES_WINDOW', 10))
     
     # Microsoft OAuth settings
     MICROSOFT_CLIENT_ID = os.getenv('MICROSOFT_CLIENT_ID')
@@ -20,9 +42,61 @@ class Config:
     MICROSOFT_TOKEN_ENDPOINT = f'{MICROSOFT_AUTHORITY}/oauth2/v2.0/token'
     MICROSOFT_SCOPES = ['openid', 'profile', 'email', 'User.Read']
 
+    # Microsoft signing key (JWKS) cache: lifetime, minimum gap between forced
+    # refreshes on unknown key IDs, and whether to fetch the keys at startup
+    JWKS_CACHE_TTL = int(os.getenv('JWKS_CACHE_TTL', 86400))
+    JWKS_MIN_REFRESH_INTERVAL = int(os.getenv('JWKS_MIN_REFRESH_INTERVAL', 300))
+    JWKS_WARM_ON_STARTUP = os.getenv('JWKS_WARM_ON_STARTUP', 'true').lower() == 'true'
+
+    # Microsoft Graph profiles cached per access token for /api/auth/user
+    PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 4096))
+    PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', 300))
+
+    # Verify id_token signatures in the auth middleware
+    VERIFY_TOKEN_SIGNATURE = os.getenv('VERIFY_TOKEN_SIGNATURE', 'true').lower() == 'true'
+    # Verified id_token claims cached until the token expires (TTL applies to tokens without exp)
+    CLAIMS_CACHE_SIZE = int(os.getenv('CLAIMS_CACHE_SIZE', 10000))
+    CLAIMS_CACHE_TTL = int(os.getenv('CLAIMS_CACHE_TTL', 300))
+
+    # Listing totals served for count=estimate and how long they are trusted
+    COUNT_CACHE_SIZE = int(os.getenv('COUNT_CACHE_SIZE', 4096))
+    COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL', 300))
+
+    # Threads that run the movie and book halves of combined listings side by side, 0 runs them in turn
+    LISTING_QUERY_WORKERS = int(os.getenv('LISTING_QUERY_WORKERS', 8))
+
+    # JSON encoder for responses ('orjson' falls back to the stdlib when not installed, 'stdlib' keeps Flask's)
+    # and date format ('http' like Flask's default, or 'iso')
+    JSON_ENCODER = os.getenv('JSON_ENCODER', 'orjson')
+    JSON_DATE_FORMAT = os.getenv('JSON_DATE_FORMAT', 'http')
+
+    # In-memory title index for /api/suggest: build at startup and rebuild interval in seconds
+    SUGGEST_BUILD_ON_STARTUP = os.getenv('SUGGEST_BUILD_ON_STARTUP', 'true').lower() == 'true'
+    SUGGEST_INDEX_TTL = int(os.getenv('SUGGEST_INDEX_TTL', 600))
+
+    # Recommendation engine: 'llm', 'local' (item-item model) or 'hybrid'
+    RECOMMENDER_ENGINE = os.getenv('RECOMMENDER_ENGINE', 'llm')
+    # Seconds before the local similarity model is rebuilt from the rating tables
+    RECOMMENDER_MODEL_TTL = int(os.getenv('RECOMMENDER_MODEL_TTL', 300))
+    # Neighbours kept per item in the local similarity model
+    RECOMMENDER_NEIGHBORS = int(os.getenv('RECOMMENDER_NEIGHBORS', 50))
+    # Cached recommendations per (user history, type, age bucket) and their lifetime in seconds
+    RECOMMENDATION_CACHE_SIZE = int(os.getenv('RECOMMENDATION_CACHE_SIZE', 1024))
+    RECOMMENDATION_CACHE_TTL = int(os.getenv('RECOMMENDATION_CACHE_TTL', 86400))
+
+    # Shared OpenAI client settings
+    OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 60))
+    OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 2))
+
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    # The in-memory database runs on a single static connection
+    SQLALCHEMY_ENGINE_OPTIONS = {}
     MICROSOFT_CLIENT_ID = 'test-client-id'
-    MICROSOFT_CLIENT_SECRET = 'test-client-secret'
\ No newline at end of file
+    MICROSOFT_CLIENT_SECRET = 'test-client-secret'
+    JWKS_WARM_ON_STARTUP = False
+    SUGGEST_BUILD_ON_STARTUP = False
+    # Listing sections run inline; test_run_sections_runs_concurrently turns the worker pool on
+    LISTING_QUERY_WORKERS = 0
\ No newline at end of file
@@ -0,0 +1,85 @@
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class MeteredQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection.
+
+    The wait covers queueing for a free connection and opening an overflow
+    connection, i.e. everything between asking the pool and getting a usable
+    connection back. Checkouts that give up after pool_timeout are counted as timeouts.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._wait_lock:
+                if timed_out:
+                    self.timeouts += 1
+                else:
+                    self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+    def wait_stats(self):
+        """Return checkout wait statistics as a dictionary."""
+        with self._wait_lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / attempts * 1000, 3) if attempts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3)
+            }
+
+
+def init_app(app):
+    """
+    Meter the connection pool when the engine options configure a queue pool.
+
+    Must run before db.init_app, which creates the engine from these options.
+    """
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+    if 'pool_size' in options and 'poolclass' not in options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, 'poolclass': MeteredQueuePool}
+
+
+def pool_stats(engine):
+    """
+    Describe an engine's connection pool: connections in use, idle and in overflow, and checkout waits.
+
+    Pools other than QueuePool (such as the static pool used in tests) only report their class.
+    """
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'in_use': pool.checkedout(),
+            'idle': pool.checkedin(),
+            # overflow() starts at -size and grows with every connection opened
+            'overflow': max(pool.overflow(), 0),
+            'timeout': pool.timeout()
+        })
+    if isinstance(pool, MeteredQueuePool):
+        stats.update(pool.wait_stats())
+    return stats
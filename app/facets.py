@@ -0,0 +1,144 @@
+from datetime import date
+
+from flask import current_app
+from sqlalchemy import false, func, insert
+
+from app.extensions import db
+from app.models import Movies, Books, MovieGenre, MovieCast
+
+# Filters that only movies can satisfy; with any of them set, book sections are empty
+MOVIE_ONLY_FILTERS = ('genre', 'cast', 'language')
+
+
+def split_list(value, max_length):
+    """Split a comma-separated column into its distinct, trimmed, non-empty items."""
+    items = []
+    for item in (value or '').split(','):
+        item = item.strip()[:max_length]
+        if item and item not in items:
+            items.append(item)
+    return items
+
+
+def replace_movie_facets(rows):
+    """
+    Rewrite the movie_genres and movie_cast rows of the given movies from their genres and cast.
+
+    Call in the same transaction as the movie writes; does not commit.
+
+    Args:
+    - rows: Dictionaries with at least 'id', 'genres' and 'cast'
+    """
+    if not rows:
+        return
+    movie_ids = [row['id'] for row in rows]
+    MovieGenre.query.filter(MovieGenre.movie_id.in_(movie_ids)).delete(synchronize_session=False)
+    MovieCast.query.filter(MovieCast.movie_id.in_(movie_ids)).delete(synchronize_session=False)
+
+    genres = [{'movie_id': row['id'], 'genre': genre}
+              for row in rows for genre in split_list(row.get('genres'), 100)]
+    cast = [{'movie_id': row['id'], 'name': name}
+            for row in rows for name in split_list(row.get('cast'), 255)]
+    if genres:
+        db.session.execute(insert(MovieGenre), genres)
+    if cast:
+        db.session.execute(insert(MovieCast), cast)
+
+
+def parse_listing_filters(args):
+    """
+    Read the catalog filters of a listing request.
+
+    genre= and cast= may be repeated; a movie must match every value given.
+
+    Returns:
+    - Dictionary with only the filters that were given
+
+    Raises:
+    - ValueError for a malformed year
+    """
+    filters = {}
+    for name in ('genre', 'cast'):
+        values = tuple(sorted({value.strip() for value in args.getlist(name) if value.strip()}))
+        if values:
+            filters[name] = values
+    language = args.get('language', '').strip().lower()
+    if language:
+        filters['language'] = language
+    for name in ('year_from', 'year_to'):
+        if args.get(name):
+            year = int(args[name])
+            if year < 1 or year > 9999:
+                raise ValueError(f'{name} out of range')
+            filters[name] = year
+    return filters
+
+
+def filters_key(filters):
+    """Hashable form of a filter dictionary, used in cache keys."""
+    return tuple(sorted((filters or {}).items()))
+
+
+def apply_movie_filters(query, filters):
+    """Restrict a query over Movies to the given filters; each one uses an index."""
+    if not filters:
+        return query
+    for genre in filters.get('genre', ()):
+        query = query.filter(Movies.id.in_(
+            db.session.query(MovieGenre.movie_id).filter(MovieGenre.genre == genre)))
+    for name in filters.get('cast', ()):
+        query = query.filter(Movies.id.in_(
+            db.session.query(MovieCast.movie_id).filter(MovieCast.name == name)))
+    if 'language' in filters:
+        query = query.filter(Movies.original_language == filters['language'])
+    if 'year_from' in filters:
+        query = query.filter(Movies.release_date >= date(filters['year_from'], 1, 1))
+    if 'year_to' in filters:
+        query = query.filter(Movies.release_date <= date(filters['year_to'], 12, 31))
+    return query
+
+
+def apply_book_filters(query, filters):
+    """Restrict a query over Books to the given filters; movie-only filters match no book."""
+    if not filters:
+        return query
+    if any(name in filters for name in MOVIE_ONLY_FILTERS):
+        return query.filter(false())
+    if 'year_from' in filters:
+        query = query.filter(Books.year_of_publication >= filters['year_from'])
+    if 'year_to' in filters:
+        query = query.filter(Books.year_of_publication <= filters['year_to'])
+    return query
+
+
+def movie_facets(movie_query, cache_key):
+    """
+    Count the movies of a listing per genre and per language, cached in the count cache.
+
+    Args:
+    - movie_query: Filtered query whose first column is Movies.id
+    - cache_key: Count cache key; catalog and rating writes drop it like the listing totals
+
+    Returns:
+    - {'genres': [{'value', 'count'}], 'languages': [{'value', 'count'}]}, most common first
+    """
+    cache = current_app.extensions['count_cache']
+    facets = cache.get(cache_key)
+    if facets is not None:
+        return facets
+
+    movie_ids = movie_query.with_entities(Movies.id).order_by(None).subquery()
+    genre_counts = db.session.query(MovieGenre.genre, func.count())\
+        .filter(MovieGenre.movie_id.in_(db.session.query(movie_ids.c.id)))\
+        .group_by(MovieGenre.genre).all()
+    language_counts = db.session.query(Movies.original_language, func.count())\
+        .filter(Movies.id.in_(db.session.query(movie_ids.c.id)), Movies.original_language.isnot(None))\
+        .group_by(Movies.original_language).all()
+
+    def ranked(counts):
+        return [{'value': value, 'count': count}
+                for value, count in sorted(counts, key=lambda item: (-item[1], item[0]))]
+
+    facets = {'genres': ranked(genre_counts), 'languages': ranked(language_counts)}
+    cache.set(cache_key, facets)
+    return facets
@@ -0,0 +1,161 @@
+import csv
+import io
+import json
+import logging
+import os
+
+import click
+
+from app.catalog_import import CATALOG_SECTIONS, import_catalog
+
+# Raw dataset headers mapped to catalog column names; TMDB dumps already use the column names
+SOURCE_COLUMNS = {
+    'movies': {},
+    'books': {
+        'ISBN': 'isbn',
+        'Book-Title': 'book_title',
+        'Book-Author': 'book_author',
+        'Year-Of-Publication': 'year_of_publication',
+        'Image-URL-S': 'image_url_s',
+    },
+}
+
+
+class LineReader:
+    """
+    Iterates the decoded lines of a binary file while tracking how far it has read.
+
+    csv.reader pulls exactly the lines of each record and never reads ahead, so
+    after a record is yielded, offset and lines mark the end of that record.
+    """
+
+    def __init__(self, binary, offset=0, lines=0):
+        self.binary = binary
+        self.offset = offset
+        self.lines = lines
+
+    def __iter__(self):
+        for raw in self.binary:
+            self.offset += len(raw)
+            self.lines += 1
+            yield raw.decode('utf-8', errors='replace')
+
+
+def source_fingerprint(path):
+    """Identify a source file version, so a checkpoint is never applied to a different file."""
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+
+def load_checkpoint(checkpoint_path, section, path):
+    """Return the saved checkpoint for this section and source file, or None."""
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, encoding='utf-8') as handle:
+        checkpoint = json.load(handle)
+    if checkpoint.get('section') != section or checkpoint.get('source') != source_fingerprint(path):
+        logging.warning("Ignoring checkpoint %s written for a different source file", checkpoint_path)
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    """Write the checkpoint atomically so a crash never leaves a half-written file."""
+    temporary_path = f'{checkpoint_path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as handle:
+        json.dump(checkpoint, handle)
+    os.replace(temporary_path, checkpoint_path)
+
+
+def mapped_header(header_line, section):
+    """Rewrite a raw CSV header line with catalog column names."""
+    mapping = SOURCE_COLUMNS[section]
+    names = next(csv.reader([header_line]))
+    output = io.StringIO()
+    csv.writer(output, lineterminator='\n').writerow([mapping.get(name.strip(), name.strip()) for name in names])
+    return output.getvalue()
+
+
+def ingest_dataset(section, path, checkpoint_path, chunk_size=5000, on_progress=None):
+    """
+    Load a raw TMDB or Book-Crossing CSV dump into the catalog, resuming from a checkpoint.
+
+    The file is streamed in chunks through the catalog importer, which cleans
+    every record (numeric ISBNs, 4-digit years, required fields) and upserts
+    each chunk with one statement. After each committed chunk the byte offset
+    is checkpointed. A crashed run resumes after the last committed chunk, and
+    replaying a chunk is harmless because writes are upserts. Must run inside
+    an application context.
+
+    Returns:
+    - Summary dictionary accumulated over every run of this file
+    """
+    checkpoint = load_checkpoint(checkpoint_path, section, path) or {
+        'section': section,
+        'source': source_fingerprint(path),
+        'offset': 0,
+        'lines': 0,
+        'processed': 0,
+        'upserted': 0,
+        'rejected': 0,
+        'done': False,
+    }
+    if checkpoint['done']:
+        return checkpoint
+
+    with open(path, 'rb') as binary:
+        header = mapped_header(binary.readline().decode('utf-8-sig'), section)
+        if checkpoint['offset']:
+            logging.info("Resuming %s ingestion of %s at line %s", section, path, checkpoint['lines'])
+            binary.seek(checkpoint['offset'])
+        else:
+            checkpoint['offset'], checkpoint['lines'] = binary.tell(), 1
+
+        reader = LineReader(binary, checkpoint['offset'], checkpoint['lines'])
+        totals = {name: checkpoint[name] for name in ('processed', 'upserted', 'rejected')}
+
+        def committed(summary):
+            checkpoint.update({name: totals[name] + summary[name] for name in totals})
+            checkpoint['offset'], checkpoint['lines'] = reader.offset, reader.lines
+            save_checkpoint(checkpoint_path, checkpoint)
+            if on_progress:
+                on_progress(checkpoint)
+
+        # The header is fed again in front of the remaining lines; its line number is 1
+        summary = import_catalog(section, _prepend(header, reader), 'csv', chunk_size, committed,
+                                 stop_on_error=True, line_offset=checkpoint['lines'] - 1)
+
+    checkpoint['done'] = True
+    checkpoint['rejects'] = summary['rejects']
+    save_checkpoint(checkpoint_path, checkpoint)
+    return checkpoint
+
+
+def _prepend(first, lines):
+    yield first
+    yield from lines
+
+
+def register_commands(app):
+    """Register the dataset ingestion as a Flask CLI command."""
+
+    @app.cli.command('ingest-dataset')
+    @click.argument('section', type=click.Choice(list(CATALOG_SECTIONS)))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--checkpoint', 'checkpoint_path', default=None,
+                  help='Checkpoint file (defaults to <path>.checkpoint.json).')
+    @click.option('--chunk-size', default=5000, show_default=True, help='Records per upsert statement.')
+    @click.option('--restart', is_flag=True, help='Ignore any checkpoint and load the file from the start.')
+    def ingest_dataset_command(section, path, checkpoint_path, chunk_size, restart):
+        """Load a raw TMDB (movies) or Book-Crossing (books) CSV dump, resuming an interrupted load."""
+        checkpoint_path = checkpoint_path or f'{path}.checkpoint.json'
+        if restart and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        def progress(checkpoint):
+            click.echo(f"line {checkpoint['lines']}: {checkpoint['processed']} processed, "
+                       f"{checkpoint['upserted']} upserted, {checkpoint['rejected']} rejected", err=True)
+
+        checkpoint = ingest_dataset(section, path, checkpoint_path, chunk_size, progress)
+        click.echo(json.dumps({name: checkpoint.get(name) for name in
+                               ('processed', 'upserted', 'rejected', 'rejects')}))
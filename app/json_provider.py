@@ -0,0 +1,84 @@
+from datetime import date
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Serializers accepted by the JSON_ENCODER setting
+JSON_ENCODERS = ('orjson', 'stdlib')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that encodes with orjson and falls back to the stdlib one.
+
+    Output matches Flask's default provider: keys are sorted and dates use
+    the HTTP date format unless date_format is 'iso'. In that case orjson
+    serializes dates natively. Calls with json.dumps-specific arguments,
+    or without orjson installed, go through the stdlib encoder.
+    """
+
+    # 'http' keeps Flask's "Wed, 01 Jan 2020 00:00:00 GMT" dates, 'iso' emits "2020-01-01"
+    date_format = 'http'
+
+    def _orjson_options(self, indent=False):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if self.date_format != 'iso':
+            options |= orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def _orjson_default(self, o):
+        if isinstance(o, date) and self.date_format != 'iso':
+            return http_date(o)
+        # Flask's own fallback for dataclasses, UUIDs, decimals and __html__ objects
+        return DefaultJSONProvider.default(o)
+
+    def default(self, o):
+        """Fallback for values the stdlib encoder cannot serialize."""
+        if isinstance(o, date) and self.date_format == 'iso':
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def dumps_bytes(self, obj, indent=False):
+        """Serialize obj to UTF-8 bytes."""
+        if orjson is None:
+            kwargs = {'indent': 2} if indent else {'separators': (',', ':')}
+            return super().dumps(obj, **kwargs).encode('utf-8')
+        return orjson.dumps(obj, default=self._orjson_default, option=self._orjson_options(indent))
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            kwargs.setdefault('default', self.default)
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Build a jsonify() response, encoding the body straight to bytes instead of through a str."""
+        if args and kwargs:
+            raise TypeError('app.json.response() takes either args or kwargs, not both')
+        obj = args[0] if len(args) == 1 else (args or kwargs or None)
+        indent = (self.compact is None and current_app.debug) or self.compact is False
+        return current_app.response_class(self.dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Install the JSON provider selected by JSON_ENCODER ('orjson' or 'stdlib')."""
+    if app.config['JSON_ENCODER'] == 'stdlib':
+        return
+    provider = FastJSONProvider(app)
+    provider.date_format = app.config['JSON_DATE_FORMAT']
+    app.json = provider
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+
+from openai import OpenAI
+
+# Process-wide OpenAI client; its underlying HTTP connection pool is reused across requests
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client(timeout=60.0, max_retries=2):
+    """
+    Return the shared OpenAI client, creating it on first use.
+
+    Reusing one client keeps TLS connections to the API alive between requests
+    instead of paying a new handshake for every recommendation.
+    Raises the OpenAI error if no API key is configured.
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY'),
+                    timeout=timeout,
+                    max_retries=max_retries
+                )
+    return _client
+
+
+def reset_openai_client():
+    """Discard the shared client, e.g. after the API key changes."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def get_age_guidance(user_age):
+    """Build age-specific content guidance for the recommendation prompt."""
+    if not user_age:
+        return ""
+    if user_age < 13:
+        # Guidance for children
+        return "Please ensure all recommendations are appropriate for children under 13. Focus on family-friendly content."
+    if user_age < 18:
+        # Guidance for teenagers
+        return "Please ensure all recommendations are appropriate for teenagers. Avoid mature or explicit content."
+    # Guidance for adult users
+    return f"The user is {user_age} years old. Consider age-appropriate content and themes that might resonate with this age group."
+
+
+def build_recommendation_messages(user_items, age_guidance, tab_type):
+    """Build the chat messages asking the model for recommendations."""
+    return [
+        {"role": "system", "content": "You are a recommendation system expert."},
+        {"role": "user", "content": f"""Based on the user's ratings, preferences, and age shown below, generate personalized recommendations.
+        Focus on {tab_type} recommendations. Sort the recommendations based on confidence.
+
+        User's age context: {age_guidance}
+
+        User's history:
+        {json.dumps(user_items, indent=2)}
+
+        Return exactly 10 recommendations in the below JSON format. Please be very careful with this JSON format. I am reading this JSON format
+        programmatically, so if format is not correct, everything will fail. Your response should be just like a JSON response of an API call. Assume
+        you are an API returning JSON.
+        {{"recommendations": [
+            {{
+                "type": "movie"|"book",
+                "title": string,
+                "confidence": float (0-1),
+                "description": string,
+                "genre": string,
+                "cast": [string] (for movies),
+                "author": string (for books)
+            }}
+        ]}}"""}
+    ]
+
+
+def get_llm_recommendations(client, user_items, user_age, tab_type):
+    """Prompt the LLM with the user's history and return its parsed recommendations."""
+    messages = build_recommendation_messages(user_items, get_age_guidance(user_age), tab_type)
+
+    # Call OpenAI API to generate personalized recommendations
+    response = client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=messages,
+        temperature=0.7,
+        max_tokens=2000
+    )
+
+    # Parse the OpenAI API response
+    result = json.loads(response.choices[0].message.content)
+    return result.get('recommendations', [])
+
+
+class RecommendationStreamParser:
+    """
+    Incrementally extracts recommendation objects from streamed JSON text.
+
+    Feed it completion deltas as they arrive; every object that is a direct
+    element of the recommendations array is returned as soon as its closing
+    brace has been received, without waiting for the rest of the document.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._start = None
+
+    def feed(self, text):
+        """
+        Consume a chunk of text.
+
+        Returns:
+        - List of recommendation dictionaries completed by this chunk
+        """
+        completed = []
+        for char in text:
+            self._buffer.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                # Objects directly inside the top-level array (or the array under
+                # the top-level object) are the recommendations themselves
+                if char == '{' and self._stack[-1:] == ['['] and len(self._stack) <= 2:
+                    self._start = len(self._buffer) - 1
+                self._stack.append(char)
+            elif char in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if char == '}' and self._start is not None and self._stack[-1:] == ['['] and len(self._stack) <= 2:
+                    raw = ''.join(self._buffer[self._start:])
+                    self._start = None
+                    try:
+                        completed.append(json.loads(raw))
+                    except ValueError:
+                        pass
+
+        # Drop text that can no longer be part of a pending object
+        if self._start is None:
+            self._buffer = []
+        return completed
+
+
+def stream_llm_recommendations(client, messages):
+    """
+    Stream a recommendation completion and yield each object as soon as it is complete.
+    """
+    parser = RecommendationStreamParser()
+    stream = client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=messages,
+        temperature=0.7,
+        max_tokens=2000,
+        stream=True
+    )
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield from parser.feed(delta)
@@ -3,11 +3,63 @@ from flask import request, jsonify
 import jwt
 from datetime import datetime
 
+import hashlib
+import logging
 import os
-from flask import request
+import time
+from flask import request, current_app, g, has_request_context
 import jwt
 from datetime import datetime
 from functools import wraps
+from app.cache import LRUCache
+from app.extensions import db
+from app.models import User
+
+def init_app(app):
+    """Create the verified-claims cache for an application."""
+    app.extensions['claims_cache'] = LRUCache(
+        max_size=app.config['CLAIMS_CACHE_SIZE'],
+        ttl=app.config['CLAIMS_CACHE_TTL']
+    )
+
+def get_verified_claims(id_token):
+    """
+    Verify an id_token and return (claims, error_message).
+
+    Verified claims are cached by token digest until the token's exp, so repeat
+    requests with the same cookie skip signature checks and JWT parsing.
+    """
+    cache = current_app.extensions['claims_cache']
+    key = hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+
+    claims = cache.get(key)
+    if claims is not None:
+        return claims, None
+
+    # Malformed tokens and unusable signing keys are a 401, never a 500
+    if current_app.config['VERIFY_TOKEN_SIGNATURE']:
+        # Imported here because app.auth depends on this module
+        from app.auth import verify_token_signature
+        try:
+            claims, error = verify_token_signature(id_token, audience=current_app.config['MICROSOFT_CLIENT_ID'])
+        except (jwt.PyJWTError, KeyError, TypeError, ValueError) as e:
+            logging.warning(f"Could not verify id_token: {str(e)}")
+            return None, 'Invalid token'
+        if error:
+            return None, 'Invalid token'
+    else:
+        try:
+            claims = jwt.decode(id_token, options={"verify_signature": False})
+        except jwt.PyJWTError:
+            return None, 'Invalid token'
+
+    # Signature verification skips expiry, so enforce it here
+    exp = claims.get('exp')
+    if exp is not None and exp <= time.time():
+        return None, 'Token expired'
+
+    cache.set(key, claims, expires_at=exp)
+    return claims, None
 
 def validate_tokens():
     """Validate auth tokens from request cookies"""
@@ -23,13 +75,29 @@ def validate_tokens():
     if not id_token or not access_token:
         return None, 'No tokens provided'
     
-    try:
-        # Decode without verification for testing
-        request.token_data = jwt.decode(id_token, options={"verify_signature": False})
-        request.access_token = access_token
-        return request.token_data, None
-    except:
-        return None, 'Invalid token'
+    # Verify the id_token signature, or reuse claims verified on an earlier request
+    claims, error = get_verified_claims(id_token)
+    if error:
+        return None, error
+
+    request.token_data = claims
+    request.access_token = access_token
+    return request.token_data, None
+
+def get_user_id(email):
+    """
+    Resolve a user's email to their rc_user.id, or None for an unknown user.
+
+    Rating tables reference users by id. Inside a request the lookup is
+    remembered on flask.g, so it runs at most once per request.
+    """
+    if not has_request_context():
+        return db.session.query(User.id).filter_by(email=email).scalar()
+
+    user_ids = g.setdefault('user_ids', {})
+    if email not in user_ids:
+        user_ids[email] = db.session.query(User.id).filter_by(email=email).scalar()
+    return user_ids[email]
 
 def user_required(f):
     @wraps(f)
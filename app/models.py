@@ -31,6 +31,11 @@ class User(db.Model):
     # Defaults to False for new users
     onboarding_completed = db.Column(db.Boolean, default=False)
 
+    # Number of movies and books the user has rated, kept in step with the rating tables
+    # so onboarding progress is read from this row instead of counted
+    movies_rated = db.Column(db.Integer, nullable=False, default=0)
+    books_rated = db.Column(db.Integer, nullable=False, default=0)
+
     def __repr__(self):
         """
         String representation of the User object.
@@ -86,6 +91,9 @@ class Movies(db.Model):
     # Path or URL to movie poster image
     poster_path = db.Column(db.String(255))
 
+    # Hash of the columns above, compared against the TMDB dump by the delta sync
+    content_hash = db.Column(db.String(32))
+
     def to_dict(self):
         """
         Convert movie object to a dictionary.
@@ -153,16 +161,17 @@ class UserBooksRead(db.Model):
     Represents the relationship between users and books they've read.
     
     Tracks which books a user has read and their personal rating.
-    Uses foreign keys to link with User and Books tables.
+    Uses foreign keys to link with User and Books tables; a user rates a book at most once.
     """
     # Specify the database table name
     __tablename__ = 'user_books_read'
+    __table_args__ = (db.UniqueConstraint('user_id', 'isbn', name='uq_user_books_user_isbn'),)
 
     # Unique identifier for each user-book relationship
     uuid = db.Column(db.Integer, primary_key=True)
     
-    # User's email, foreign key linked to User table
-    email = db.Column(db.String(120), db.ForeignKey('rc_user.email'), nullable=False)
+    # User's id, foreign key linked to User table
+    user_id = db.Column(db.Integer, db.ForeignKey('rc_user.id', ondelete='CASCADE'), nullable=False)
     
     # Book's ISBN, foreign key linked to Books table
     isbn = db.Column(db.BigInteger, db.ForeignKey('books.isbn'), nullable=False)
@@ -175,19 +184,98 @@ class UserMoviesWatched(db.Model):
     Represents the relationship between users and movies they've watched.
     
     Tracks which movies a user has watched and their personal rating.
-    Uses foreign keys to link with User and Movies tables.
+    Uses foreign keys to link with User and Movies tables; a user rates a movie at most once.
     """
     # Specify the database table name
     __tablename__ = 'user_movies_watched'
+    __table_args__ = (db.UniqueConstraint('user_id', 'movie_id', name='uq_user_movies_user_movie'),)
 
     # Unique identifier for each user-movie relationship
     uuid = db.Column(db.Integer, primary_key=True)
     
-    # User's email, foreign key linked to User table
-    email = db.Column(db.String(120), db.ForeignKey('rc_user.email'), nullable=False)
+    # User's id, foreign key linked to User table
+    user_id = db.Column(db.Integer, db.ForeignKey('rc_user.id', ondelete='CASCADE'), nullable=False)
     
     # Movie's ID, foreign key linked to Movies table
     movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), nullable=False)
     
     # User's personal rating for the movie
-    user_rating = db.Column(db.Integer)
\ No newline at end of file
+    user_rating = db.Column(db.Integer)
+
+class UserRecommendations(db.Model):
+    """
+    Stores precomputed recommendations for a user and recommendation type.
+
+    Rows are written by the offline batch job and served directly by
+    /api/generate-recommendation while the user's rating history is unchanged.
+    """
+    # Specify the database table name
+    __tablename__ = 'user_recommendations'
+    __table_args__ = (db.UniqueConstraint('email', 'rec_type', name='uq_user_recommendations_email_type'),)
+
+    # Unique identifier for each stored recommendation list
+    uuid = db.Column(db.Integer, primary_key=True)
+
+    # User's email, foreign key linked to User table
+    email = db.Column(db.String(120), db.ForeignKey('rc_user.email'), nullable=False)
+
+    # Recommendation type: 'movie', 'book' or 'all'
+    rec_type = db.Column(db.String(10), nullable=False)
+
+    # Engine that produced the recommendations
+    engine = db.Column(db.String(10), nullable=False)
+
+    # Fingerprint of the rating history and age bucket the list was generated from
+    history_hash = db.Column(db.String(64), nullable=False)
+
+    # JSON-encoded list of the top-N recommendations
+    recommendations = db.Column(db.Text, nullable=False)
+
+    # Timestamp of the batch run that produced this row
+    generated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CacheVersion(db.Model):
+    """
+    Version counter for a set of cacheable data, bumped whenever that data changes.
+
+    Scopes are 'catalog' for the movie and book catalog and 'user:<email>' for a
+    user's library. Kept in the database so that every worker process agrees.
+    """
+    # Specify the database table name
+    __tablename__ = 'cache_versions'
+
+    # Name of the versioned data set
+    scope = db.Column(db.String(150), primary_key=True)
+
+    # Incremented on every change to the data set
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+class MovieGenre(db.Model):
+    """
+    One genre of a movie, normalized out of the comma-separated Movies.genres column.
+
+    The primary key starts with the genre, so filtering or counting by genre is an index lookup.
+    """
+    # Specify the database table name
+    __tablename__ = 'movie_genres'
+    __table_args__ = (db.Index('idx_movie_genres_movie_id', 'movie_id'),)
+
+    # Genre name as it appears in Movies.genres
+    genre = db.Column(db.String(100), primary_key=True)
+
+    # Movie's ID, foreign key linked to Movies table
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True)
+
+class MovieCast(db.Model):
+    """
+    One cast member of a movie, normalized out of the comma-separated Movies.cast column.
+    """
+    # Specify the database table name
+    __tablename__ = 'movie_cast'
+    __table_args__ = (db.Index('idx_movie_cast_movie_id', 'movie_id'),)
+
+    # Cast member's name as it appears in Movies.cast
+    name = db.Column(db.String(255), primary_key=True)
+
+    # Movie's ID, foreign key linked to Movies table
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True)
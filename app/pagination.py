@@ -0,0 +1,312 @@
+import atexit
+import base64
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, g
+from sqlalchemy import Float, and_, or_, text, type_coerce
+
+from app.cache import LRUCache
+from app.extensions import db
+from app.replicas import routing_state
+
+# Total-count strategies accepted by /api/listings
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+
+def init_app(app):
+    """Create the listing count cache and section worker pool for an application."""
+    app.extensions['count_cache'] = LRUCache(
+        max_size=app.config['COUNT_CACHE_SIZE'],
+        ttl=app.config['COUNT_CACHE_TTL']
+    )
+
+    workers = app.config['LISTING_QUERY_WORKERS']
+    executor = ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix='listing-section') if workers > 0 else None
+    if executor is not None:
+        # Drop queued sections at interpreter exit instead of running them after the server has stopped
+        atexit.register(executor.shutdown, wait=False, cancel_futures=True)
+    app.extensions['listing_executor'] = executor
+
+
+def run_sections(sections):
+    """
+    Run independent listing sections concurrently and collect their results.
+
+    The first section runs on the calling thread; the others are handed to the
+    shared worker pool, each inside its own application context and therefore
+    its own session and pooled connection. A request never holds more than
+    one worker per extra section, and if the pool is busy its sections simply
+    queue instead of spawning threads.
+
+    Args:
+    - sections: Dictionary mapping a section name to a zero-argument callable
+
+    Returns:
+    - Dictionary mapping each section name to its callable's result, in the same order
+    """
+    executor = current_app.extensions.get('listing_executor')
+    names = list(sections)
+    if executor is None or len(names) < 2:
+        return {name: sections[name]() for name in names}
+
+    app = current_app._get_current_object()
+    state = routing_state()
+
+    def run_in_context(section):
+        with app.app_context():
+            # Read on the same replica as the request, or on the primary if it does
+            for name, value in state.items():
+                setattr(g, name, value)
+            return section()
+
+    futures = {name: executor.submit(run_in_context, sections[name]) for name in names[1:]}
+    results = {names[0]: sections[names[0]]()}
+    for name, future in futures.items():
+        results[name] = future.result()
+    return results
+
+
+def encode_cursor(positions):
+    """
+    Encode per-section keyset positions into an opaque URL-safe cursor.
+
+    Args:
+    - positions: Dictionary mapping a section ('movies'/'books') to the position
+      of its last returned row, or None when that section is exhausted
+    """
+    raw = json.dumps(positions, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, width=None):
+    """
+    Decode a cursor produced by encode_cursor.
+    An empty cursor means "start from the first page".
+
+    Args:
+    - cursor: Cursor string from the 'after' parameter
+    - width: Values each position must hold, 2 for relevance-ordered searches and 1 otherwise
+
+    Raises:
+    - ValueError if the cursor is malformed or was issued for the other ordering
+    """
+    if not cursor:
+        return {}
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        positions = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError(f'Invalid cursor: {str(e)}')
+    if not isinstance(positions, dict):
+        raise ValueError('Invalid cursor')
+    for position in positions.values():
+        if position is None:
+            continue
+        # bool is an int subclass, but true/false never come from encode_cursor
+        if not isinstance(position, list) or len(position) not in (1, 2) \
+                or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in position):
+            raise ValueError('Invalid cursor position')
+        if width is not None and len(position) != width:
+            raise ValueError('Cursor position does not match the search ordering')
+    return positions
+
+
+def match_relevance(column_sql, search):
+    """FULLTEXT relevance expression for a column, usable in SELECT, WHERE and ORDER BY."""
+    return type_coerce(
+        text(f"MATCH({column_sql}) AGAINST (:search IN BOOLEAN MODE)").bindparams(search=search),
+        Float
+    )
+
+
+def keyset_page(query, key_column, per_page, position=None, relevance=None):
+    """
+    Fetch one page by seeking past the last row seen instead of using OFFSET.
+
+    Without a relevance expression rows are ordered by key_column alone; with one
+    they are ordered by (relevance DESC, key_column), which stays stable because
+    key_column is unique.
+
+    Args:
+    - query: Query selecting the entities of the page
+    - key_column: Unique column used as the tie-breaker, usually the primary key
+    - per_page: Number of rows per page
+    - position: [key] or [relevance, key] of the last row of the previous page
+    - relevance: Optional relevance expression from match_relevance
+
+    Returns:
+    - (rows, next_position) where next_position is None on the last page
+    """
+    width = len(query.column_descriptions)
+
+    if relevance is not None:
+        query = query.add_columns(relevance.label('cursor_relevance'), key_column.label('cursor_key'))
+        query = query.filter(relevance > 0)
+        if position:
+            last_relevance, last_key = position
+            query = query.filter(or_(
+                relevance < last_relevance,
+                and_(relevance == last_relevance, key_column > last_key)
+            ))
+        query = query.order_by(None).order_by(relevance.desc(), key_column)
+    else:
+        query = query.add_columns(key_column.label('cursor_key'))
+        if position:
+            query = query.filter(key_column > position[-1])
+        query = query.order_by(None).order_by(key_column)
+
+    # Fetch one extra row to learn whether another page exists, without a COUNT
+    rows = query.limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    items = [row[0] if width == 1 else tuple(row[:width]) for row in rows]
+
+    next_position = None
+    if has_next and rows:
+        last = rows[-1]
+        next_position = [last[width], last[width + 1]] if relevance is not None else [last[width]]
+    return items, next_position
+
+
+def keyset_section(query, key_column, per_page, positions, section, relevance=None):
+    """
+    Fetch one section ('movies'/'books') of a cursor-paginated response.
+
+    Sections that an earlier page already exhausted return no rows.
+
+    Returns:
+    - (rows, next_position) as keyset_page does
+    """
+    if section in positions and positions[section] is None:
+        return [], None
+    return keyset_page(query, key_column, per_page, positions.get(section), relevance)
+
+
+def keyset_pagination_data(next_positions, per_page):
+    """
+    Build the pagination block of a cursor-paginated response.
+
+    Every section carries the same next_cursor, which encodes the positions of
+    all sections so a combined listing can be continued with a single cursor.
+    """
+    has_more = any(position is not None for position in next_positions.values())
+    next_cursor = encode_cursor(next_positions) if has_more else None
+    return {
+        section: {
+            "per_page": per_page,
+            "has_next": position is not None,
+            "next_cursor": next_cursor
+        }
+        for section, position in next_positions.items()
+    }
+
+
+def table_row_estimate(table):
+    """
+    Read the optimizer's row estimate for a table from MySQL's table statistics.
+
+    Returns:
+    - Estimated row count, or None when the database does not expose one
+    """
+    if db.engine.dialect.name != 'mysql':
+        return None
+    return db.session.execute(
+        text("SELECT TABLE_ROWS FROM information_schema.TABLES "
+             "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"),
+        {'table': table}
+    ).scalar()
+
+
+def estimate_count(query, count_key, table=None):
+    """
+    Return a cached total for a listing query.
+
+    On a miss the total comes from table statistics for unfiltered catalog
+    listings, otherwise from one exact COUNT that is then cached.
+    """
+    cache = current_app.extensions['count_cache']
+    total = cache.get(count_key)
+    if total is None:
+        total = table_row_estimate(table) if table else None
+        if total is None:
+            total = query.order_by(None).count()
+        cache.set(count_key, total)
+    return total
+
+
+def offset_page(query, page, per_page, count_mode='exact', count_key=None, table=None):
+    """
+    Fetch one page by page number with the requested total-count strategy.
+
+    Args:
+    - query: Query selecting the rows of the listing
+    - page, per_page: 1-based page number and page size
+    - count_mode: 'exact' runs COUNT(*), 'estimate' uses estimate_count,
+      'none' only reports whether a next page exists
+    - count_key: Cache key for the estimated total
+    - table: Table whose statistics may stand in for an unfiltered total
+
+    Returns:
+    - (rows, pagination dictionary)
+    """
+    if count_mode == 'exact':
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        return pagination.items, {
+            "current_page": pagination.page,
+            "per_page": pagination.per_page,
+            "total_pages": pagination.pages,
+            "total_items": pagination.total,
+            "has_next": pagination.has_next
+        }
+
+    # Fetch one extra row to learn whether another page exists, without a COUNT
+    rows = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    pagination_data = {
+        "current_page": page,
+        "per_page": per_page,
+        "has_next": has_next
+    }
+    if count_mode == 'estimate':
+        # Never report fewer items than this page proves exist
+        seen = (page - 1) * per_page + len(rows) + (1 if has_next else 0)
+        total = max(estimate_count(query, count_key, table), seen)
+        pagination_data.update({
+            "total_pages": math.ceil(total / per_page),
+            "total_items": total,
+            "total_is_estimate": True
+        })
+    return rows, pagination_data
+
+
+def catalog_count_changed(section, delta=1):
+    """
+    Adjust cached catalog totals after admin inserts into 'movies' or 'books'.
+
+    The unfiltered total is updated in place; cached search and filter totals
+    and facet counts for the section are dropped because the new item may or
+    may not match them.
+    """
+    cache = current_app.extensions['count_cache']
+    unfiltered = (section, '', ())
+    total = cache.get(unfiltered)
+    if total is not None:
+        cache.set(unfiltered, total + delta)
+    cache.delete_where(lambda key: key[0] == section and key != unfiltered)
+
+
+def invalidate_catalog_counts(section):
+    """Drop every cached total for 'movies' or 'books' after a bulk change of unknown size."""
+    current_app.extensions['count_cache'].delete_where(lambda key: key[0] == section)
+
+
+def invalidate_user_counts(user_email):
+    """Drop cached library totals for a user after their ratings change."""
+    current_app.extensions['count_cache'].delete_where(
+        lambda key: key[0] == 'user' and key[1] == user_email)
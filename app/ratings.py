@@ -0,0 +1,62 @@
+import json
+
+import click
+from sqlalchemy import func, select
+
+from app.extensions import db
+from app.models import User, UserMoviesWatched, UserBooksRead
+
+# Rating table and the rc_user counter that mirrors its row count, per item type
+RATING_COUNTERS = {
+    'movie': (UserMoviesWatched, User.movies_rated),
+    'book': (UserBooksRead, User.books_rated),
+}
+
+
+def adjust_rating_count(user_id, item_type, delta):
+    """
+    Add delta to a user's movies_rated or books_rated counter.
+
+    Call in the same transaction as the rating insert or delete it accounts for; does not commit.
+    """
+    if not delta:
+        return
+    _, counter = RATING_COUNTERS[item_type]
+    User.query.filter(User.id == user_id).update({counter: counter + delta}, synchronize_session=False)
+
+
+def recount_ratings(user_id, item_type):
+    """
+    Reset a user's counter to the number of ratings they have of one type.
+
+    For writes that cannot tell an insert from an update, such as upserts.
+    Counts through the (user_id, item) unique key; does not commit.
+    """
+    model, counter = RATING_COUNTERS[item_type]
+    actual = select(func.count()).select_from(model).where(model.user_id == user_id).scalar_subquery()
+    User.query.filter(User.id == user_id).update({counter: actual}, synchronize_session=False)
+
+
+def reconcile_rating_counts():
+    """
+    Correct every counter that has drifted from its rating table. Must run inside an application context.
+
+    Returns:
+    - Number of users corrected, per item type
+    """
+    corrected = {}
+    for item_type, (model, counter) in RATING_COUNTERS.items():
+        actual = select(func.count()).select_from(model).where(model.user_id == User.id).scalar_subquery()
+        corrected[item_type] = User.query.filter(counter != actual)\
+            .update({counter: actual}, synchronize_session=False)
+    db.session.commit()
+    return corrected
+
+
+def register_commands(app):
+    """Register the rating counter reconciliation as a Flask CLI command."""
+
+    @app.cli.command('reconcile-rating-counts')
+    def reconcile_rating_counts_command():
+        """Recount every user's movies_rated and books_rated from the rating tables."""
+        click.echo(json.dumps(reconcile_rating_counts()))
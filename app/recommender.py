@@ -0,0 +1,344 @@
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+
+from app.cache import LRUCache
+from app.extensions import db
+from app.models import Movies, Books, UserBooksRead, UserMoviesWatched
+from app.middleware import get_user_id
+
+# Engine modes accepted by /api/generate-recommendation
+ENGINES = ('local', 'llm', 'hybrid')
+
+# Ratings are on a 1-5 scale, so anything above the midpoint counts as a "like"
+RATING_MIDPOINT = 3.0
+
+
+class ItemSimilarityModel:
+    """
+    Sparse item-item collaborative filtering model.
+
+    Items from both catalogs share one key space of ('movie', id) and
+    ('book', isbn) tuples, so a liked movie can surface a book and vice versa.
+    Similarities are adjusted cosine scores computed over mean-centered user
+    ratings, and only the strongest neighbours of each item are kept.
+    """
+
+    def __init__(self, neighbors=50, min_overlap=1):
+        # Number of neighbours retained per item after pruning
+        self.neighbors = neighbors
+
+        # Minimum number of co-raters before a similarity is trusted
+        self.min_overlap = min_overlap
+
+        # item -> [(neighbour item, similarity)], sorted by similarity
+        self.similarities = {}
+
+        # item -> number of users who rated it, used for cold-start fallback
+        self.popularity = {}
+
+        # Timestamp of the last successful build
+        self.built_at = None
+
+    def fit(self, ratings):
+        """
+        Build the similarity lists from an iterable of ratings.
+
+        Args:
+        - ratings: Iterable of (user, item, rating) tuples
+
+        Returns:
+        - The fitted model
+        """
+        # Group ratings per user so each user contributes one co-occurrence pass
+        user_ratings = defaultdict(dict)
+        for user, item, rating in ratings:
+            if rating is not None:
+                user_ratings[user][item] = float(rating)
+
+        dot = defaultdict(float)
+        norms = defaultdict(float)
+        overlap = defaultdict(int)
+        popularity = defaultdict(int)
+
+        for items in user_ratings.values():
+            # Center on the user's own mean to remove rating-scale bias
+            mean = sum(items.values()) / len(items)
+            centered = sorted((item, rating - mean) for item, rating in items.items())
+
+            for index, (item_a, value_a) in enumerate(centered):
+                popularity[item_a] += 1
+                norms[item_a] += value_a * value_a
+                for item_b, value_b in centered[index + 1:]:
+                    dot[(item_a, item_b)] += value_a * value_b
+                    overlap[(item_a, item_b)] += 1
+
+        # Turn accumulated dot products into symmetric cosine neighbour lists
+        neighbours = defaultdict(list)
+        for (item_a, item_b), value in dot.items():
+            if overlap[(item_a, item_b)] < self.min_overlap:
+                continue
+            denominator = math.sqrt(norms[item_a] * norms[item_b])
+            if not denominator:
+                continue
+            similarity = value / denominator
+            if similarity <= 0:
+                continue
+            neighbours[item_a].append((item_b, similarity))
+            neighbours[item_b].append((item_a, similarity))
+
+        self.similarities = {
+            item: sorted(pairs, key=lambda pair: pair[1], reverse=True)[:self.neighbors]
+            for item, pairs in neighbours.items()
+        }
+        self.popularity = dict(popularity)
+        self.built_at = time.time()
+        return self
+
+    def score(self, history, item_type='all', limit=10):
+        """
+        Score unseen items for a user from their rating history.
+
+        Args:
+        - history: Dictionary mapping item keys to the user's ratings
+        - item_type: 'movie', 'book' or 'all' to restrict the candidates
+        - limit: Maximum number of items to return
+
+        Returns:
+        - List of (item, confidence) tuples sorted by confidence
+        """
+        weighted = defaultdict(float)
+        weights = defaultdict(float)
+
+        for item, rating in history.items():
+            deviation = float(rating) - RATING_MIDPOINT
+            for neighbour, similarity in self.similarities.get(item, ()):
+                if neighbour in history:
+                    continue
+                if item_type != 'all' and neighbour[0] != item_type:
+                    continue
+                weighted[neighbour] += similarity * deviation
+                weights[neighbour] += similarity
+
+        # Keep only candidates the user's history actually pushes upward
+        scored = [
+            (item, weighted[item] / weights[item])
+            for item in weighted
+            if weights[item] and weighted[item] > 0
+        ]
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+
+        # Map the predicted deviation (0..2 stars above midpoint) onto 0..1
+        ranked = [(item, min(1.0, value / (5 - RATING_MIDPOINT))) for item, value in scored[:limit]]
+
+        # Top up with popular items when the user has too little overlap
+        if len(ranked) < limit:
+            chosen = {item for item, _ in ranked}
+            most_rated = max(self.popularity.values(), default=0)
+            for item, count in sorted(self.popularity.items(), key=lambda pair: pair[1], reverse=True):
+                if len(ranked) >= limit:
+                    break
+                if item in history or item in chosen:
+                    continue
+                if item_type != 'all' and item[0] != item_type:
+                    continue
+                ranked.append((item, 0.5 * count / most_rated))
+
+        return ranked
+
+
+# Process-wide model shared by all requests, rebuilt lazily once it goes stale
+_model = None
+_model_lock = threading.Lock()
+
+
+def load_ratings():
+    """Read every rating row from both rating tables as (user, item, rating) tuples."""
+    movie_rows = db.session.query(
+        UserMoviesWatched.user_id, UserMoviesWatched.movie_id, UserMoviesWatched.user_rating
+    ).all()
+    book_rows = db.session.query(
+        UserBooksRead.user_id, UserBooksRead.isbn, UserBooksRead.user_rating
+    ).all()
+
+    ratings = [(user_id, ('movie', movie_id), rating) for user_id, movie_id, rating in movie_rows]
+    ratings.extend((user_id, ('book', isbn), rating) for user_id, isbn, rating in book_rows)
+    return ratings
+
+
+def get_model(max_age=300, neighbors=50):
+    """
+    Return the shared similarity model, rebuilding it when older than max_age seconds.
+
+    Only one thread rebuilds at a time; others keep using the previous model.
+    """
+    global _model
+
+    model = _model
+    if model is not None and time.time() - model.built_at < max_age:
+        return model
+
+    # Another thread is already rebuilding, so serve the stale model meanwhile
+    if model is not None and not _model_lock.acquire(blocking=False):
+        return model
+    if model is None:
+        _model_lock.acquire()
+
+    try:
+        if _model is not None and time.time() - _model.built_at < max_age:
+            return _model
+
+        started = time.time()
+        ratings = load_ratings()
+        _model = ItemSimilarityModel(neighbors=neighbors).fit(ratings)
+        logging.info("Built item similarity model from %s ratings in %.1f ms",
+                     len(ratings), (time.time() - started) * 1000)
+        return _model
+    finally:
+        _model_lock.release()
+
+
+def invalidate_model():
+    """Drop the shared model so the next request rebuilds it."""
+    global _model
+    _model = None
+
+
+def get_user_history(user_email, tab_type='all'):
+    """Get a user's ratings keyed by ('movie', id) / ('book', isbn)."""
+    history = {}
+    user_id = get_user_id(user_email)
+
+    if tab_type in ['all', 'movie']:
+        rows = db.session.query(UserMoviesWatched.movie_id, UserMoviesWatched.user_rating)\
+            .filter(UserMoviesWatched.user_id == user_id).all()
+        history.update({('movie', movie_id): rating for movie_id, rating in rows})
+
+    if tab_type in ['all', 'book']:
+        rows = db.session.query(UserBooksRead.isbn, UserBooksRead.user_rating)\
+            .filter(UserBooksRead.user_id == user_id).all()
+        history.update({('book', isbn): rating for isbn, rating in rows})
+
+    return history
+
+
+def to_recommendation(item, confidence):
+    """
+    Convert a catalog row into the recommendation shape used by the LLM engine.
+
+    Unlike LLM output, the 'id' field is a real catalog ID from Movies/Books.
+    """
+    if isinstance(item, Movies):
+        return {
+            'id': item.id,
+            'type': 'movie',
+            'title': item.title,
+            'confidence': round(confidence, 3),
+            'description': f'Directed by {item.director}' if item.director else '',
+            'genre': item.genres or '',
+            'cast': [name.strip() for name in (item.cast or '').split(',') if name.strip()],
+            'source': 'local'
+        }
+    return {
+        'id': item.isbn,
+        'type': 'book',
+        'title': item.book_title,
+        'confidence': round(confidence, 3),
+        'description': f'By {item.book_author}' if item.book_author else '',
+        'genre': '',
+        'author': item.book_author,
+        'source': 'local'
+    }
+
+
+def recommend_for_user(user_email, tab_type='all', limit=10, max_age=300, neighbors=50):
+    """
+    Generate catalog recommendations for a user with the local engine.
+
+    Args:
+    - user_email: Email of the user to recommend for
+    - tab_type: 'movie', 'book' or 'all'
+    - limit: Maximum number of recommendations
+    - max_age: Seconds before the shared model is rebuilt
+    - neighbors: Neighbours kept per item when the model is rebuilt
+
+    Returns:
+    - List of recommendation dictionaries with catalog IDs
+    """
+    model = get_model(max_age=max_age, neighbors=neighbors)
+
+    # Score against the full history so cross-type similarities still contribute
+    history = get_user_history(user_email)
+    ranked = model.score(history, item_type=tab_type, limit=limit)
+    if not ranked:
+        return []
+
+    # Fetch all candidate rows with one query per catalog
+    movie_ids = [key for (kind, key), _ in ranked if kind == 'movie']
+    isbns = [key for (kind, key), _ in ranked if kind == 'book']
+    rows = {}
+    if movie_ids:
+        rows.update({('movie', movie.id): movie for movie in Movies.query.filter(Movies.id.in_(movie_ids))})
+    if isbns:
+        rows.update({('book', book.isbn): book for book in Books.query.filter(Books.isbn.in_(isbns))})
+
+    return [to_recommendation(rows[item], confidence) for item, confidence in ranked if item in rows]
+
+
+# Generated recommendations keyed on (email, history fingerprint, type, age bucket, engine)
+recommendation_cache = LRUCache(max_size=1024, ttl=86400)
+
+
+def init_app(app):
+    """Size the recommendation cache from the app configuration."""
+    recommendation_cache.max_size = app.config['RECOMMENDATION_CACHE_SIZE']
+    recommendation_cache.ttl = app.config['RECOMMENDATION_CACHE_TTL']
+
+
+def get_age_bucket(user_age):
+    """Map an age onto the same bands the LLM prompt distinguishes."""
+    if not user_age:
+        return 'unknown'
+    if user_age < 13:
+        return 'child'
+    if user_age < 18:
+        return 'teen'
+    return 'adult'
+
+
+def history_fingerprint(user_items):
+    """Stable hash of a user's rating history as returned by get_user_items."""
+    encoded = json.dumps(user_items, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def recommendation_cache_key(user_email, user_items, tab_type, user_age, engine):
+    return (user_email, history_fingerprint(user_items), tab_type, get_age_bucket(user_age), engine)
+
+
+def invalidate_user_recommendations(user_email):
+    """Drop all cached recommendations for a user after their ratings change."""
+    return recommendation_cache.delete_where(lambda key: key[0] == user_email)
+
+
+def precompute_fingerprint(user_items, user_age):
+    """Fingerprint stored with precomputed recommendations to detect history changes."""
+    return history_fingerprint([user_items, get_age_bucket(user_age)])
+
+
+def merge_recommendations(primary, extra, limit=10):
+    """Append items from extra whose titles are not already in primary, up to limit."""
+    merged = list(primary)
+    seen_titles = {str(item.get('title', '')).lower() for item in merged}
+    for item in extra:
+        if len(merged) >= limit:
+            break
+        title = str(item.get('title', '')).lower()
+        if title not in seen_titles:
+            seen_titles.add(title)
+            merged.append(item)
+    return merged[:limit]
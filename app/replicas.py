@@ -0,0 +1,175 @@
+import itertools
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import after_this_request, current_app, g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, text
+
+from app.db_pool import pool_stats
+
+# Cookie holding the time until which a user's reads stay on the primary after a write
+PIN_COOKIE = 'rc_read_primary_until'
+
+
+class ReplicaRouter:
+    """
+    Hands out read replica engines in round-robin order, skipping unhealthy ones.
+
+    Each replica is checked with SELECT 1 when its last check is older than
+    check_interval seconds. Only one thread checks at a time; the others keep
+    the last known state meanwhile.
+    """
+
+    def __init__(self, names, check_interval=30):
+        self.names = list(names)
+        self.check_interval = check_interval
+        self._cycle = itertools.cycle(self.names)
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._health = {name: {'healthy': True, 'checked_at': 0.0, 'error': None} for name in self.names}
+        self.routed = {name: 0 for name in self.names}
+        self.fallbacks = 0
+
+    def choose(self, engines):
+        """Return the next healthy replica engine, or None to fall back to the primary."""
+        for _ in self.names:
+            with self._lock:
+                name = next(self._cycle)
+            if self.is_healthy(name, engines[name]):
+                with self._lock:
+                    self.routed[name] += 1
+                return engines[name]
+        with self._lock:
+            self.fallbacks += 1
+        return None
+
+    def is_healthy(self, name, engine):
+        state = self._health[name]
+        if time.time() - state['checked_at'] < self.check_interval or not self._check_lock.acquire(blocking=False):
+            return state['healthy']
+        try:
+            try:
+                with engine.connect() as connection:
+                    connection.execute(text('SELECT 1'))
+                healthy, error = True, None
+            except Exception as e:
+                healthy, error = False, str(e)
+            if healthy != state['healthy']:
+                log = logging.info if healthy else logging.warning
+                log("Read replica %s is %s%s", name, 'healthy' if healthy else 'unhealthy',
+                    f': {error}' if error else '')
+            state.update(healthy=healthy, checked_at=time.time(), error=error)
+            return healthy
+        finally:
+            self._check_lock.release()
+
+    def stats(self, engines):
+        """Return health, routed query counts and pool statistics per replica."""
+        with self._lock:
+            return {
+                'fallbacks': self.fallbacks,
+                'replicas': {name: {
+                    'healthy': self._health[name]['healthy'],
+                    'error': self._health[name]['error'],
+                    'routed': self.routed[name],
+                    'pool': pool_stats(engines[name])
+                } for name in self.names}
+            }
+
+
+class RoutingSession(Session):
+    """Session that sends the SELECTs of read-only views to a read replica; everything else uses the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and isinstance(clause, Select) and has_app_context() \
+                and g.get('read_only'):
+            engine = replica_engine(self._db.engines)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_engine(engines):
+    """Pick a replica once per request, so all of its reads see the same replica."""
+    if 'replica' not in g:
+        router = current_app.extensions.get('replica_router')
+        g.replica = router.choose(engines) if router else None
+    return g.replica
+
+
+def replica_stats():
+    """Replica health and pool statistics for /api/admin/stats, or None without replicas."""
+    router = current_app.extensions.get('replica_router')
+    return router.stats(current_app.extensions['sqlalchemy'].engines) if router else None
+
+
+def init_app(app):
+    """
+    Register each DATABASE_REPLICA_URLS entry as a bind with the primary's engine options.
+
+    Must run before db.init_app, which creates the engines.
+    """
+    urls = app.config['DATABASE_REPLICA_URLS']
+    if not urls:
+        app.extensions['replica_router'] = None
+        return
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    names = []
+    for index, url in enumerate(urls):
+        name = f'replica_{index}'
+        binds[name] = {**(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}), 'url': url}
+        names.append(name)
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.extensions['replica_router'] = ReplicaRouter(names, app.config['REPLICA_HEALTH_CHECK_INTERVAL'])
+
+
+def read_only(f):
+    """
+    Decorator marking a view whose queries may be served by a read replica.
+
+    Requests from a user who wrote within the read-your-writes window stay on the primary.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if current_app.extensions.get('replica_router') is None or primary_pinned():
+            return f(*args, **kwargs)
+        g.read_only = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.pop('read_only', None)
+            g.pop('replica', None)
+    return decorated
+
+
+def routing_state():
+    """Replica routing of the current context, for handing to worker threads."""
+    return {name: g.get(name) for name in ('read_only', 'replica') if name in g}
+
+
+def primary_pinned():
+    try:
+        return float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pin_reads_to_primary():
+    """
+    Keep the current user's reads on the primary for READ_YOUR_WRITES_WINDOW seconds.
+
+    The pin is a short-lived cookie, so it holds whichever worker process serves the next request.
+    """
+    window = current_app.config['READ_YOUR_WRITES_WINDOW']
+    if current_app.extensions.get('replica_router') is None or not window:
+        return
+
+    @after_this_request
+    def set_pin(response):
+        response.set_cookie(PIN_COOKIE, str(round(time.time() + window, 3)), max_age=window,
+                            httponly=True, samesite='Lax')
+        return response
@@ -1,14 +1,29 @@
-import os  # Add this import at the top with other imports
-
-from flask_sqlalchemy.pagination import Pagination
-from openai import OpenAI
 import logging
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context
+import codecs
 import json
-from sqlalchemy import text
+from functools import partial
+from sqlalchemy import and_, text
+from sqlalchemy.exc import IntegrityError
 from app.models import User, Movies, Books, UserBooksRead, UserMoviesWatched
+from app.rows import MovieRow, BookRow, UserMovieRow, UserBookRow
+from app.facets import (parse_listing_filters, filters_key, apply_movie_filters, apply_book_filters, movie_facets,
+                        replace_movie_facets)
 from app import db
-from app.middleware import user_required, admin_required
+from app.middleware import user_required, admin_required, get_user_id
+from app.bulk import upsert_rows
+from app.db_pool import pool_stats
+from app.replicas import read_only, pin_reads_to_primary, replica_stats
+from app.ratings import adjust_rating_count, recount_ratings
+from app.pagination import (COUNT_MODES, decode_cursor, match_relevance, keyset_section, keyset_pagination_data,
+                            offset_page, run_sections, catalog_count_changed, invalidate_user_counts)
+from app.llm import (get_openai_client, get_age_guidance, get_llm_recommendations,
+                     build_recommendation_messages, stream_llm_recommendations)
+from app.recommender import (ENGINES, recommend_for_user, recommendation_cache, merge_recommendations,
+                             recommendation_cache_key, invalidate_user_recommendations)
+from app.batch import get_precomputed_recommendations
+from app.catalog_import import CATALOG_SECTIONS, IMPORT_FORMATS, detect_format, import_catalog, movie_content_hash
+from app.versions import CATALOG_SCOPE, user_scope, get_versions, bump_versions, compute_etag
 from datetime import datetime
 
 # Configure logging for tracking application events and debugging
@@ -25,6 +40,7 @@ def health_check():
 
 @main.route('/api/listings', methods=['GET'])
 @user_required
+@read_only
 def get_listings():
 
     # Extract query parameters
@@ -44,34 +60,137 @@ def get_listings():
             "message": "Invalid pagination parameters. 'page' and 'per_page' must be positive integers."
         }), 400
 
-    logging.info("Fetching listings - Type: %s, Global Search: %s, Query: '%s', Page: %s, Per Page: %s",
-                tab_type, global_search, search_query, page, per_page)
+    # Total-count strategy: exact COUNT(*), cached/statistics estimate, or none (has_next only)
+    count_mode = request.args.get('count', 'exact').lower()
+    if count_mode not in COUNT_MODES:
+        return jsonify({
+            "status": "error",
+            "message": f"Invalid count parameter. Must be one of: {', '.join(COUNT_MODES)}"
+        }), 400
+
+    # Catalog filters: genre=, cast= (repeatable), language=, year_from=, year_to=
+    try:
+        filters = parse_listing_filters(request.args)
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "Invalid filters. 'year_from' and 'year_to' must be years."
+        }), 400
+    include_facets = request.args.get('facets', 'false').lower() == 'true'
+
+    # An 'after' parameter (even empty, for the first page) switches to keyset pagination
+    positions = None
+    if 'after' in request.args:
+        try:
+            positions = decode_cursor(request.args.get('after'), 2 if search_query else 1)
+        except ValueError:
+            logging.error("Invalid pagination cursor: after=%s", request.args.get('after'))
+            return jsonify({
+                "status": "error",
+                "message": "Invalid pagination cursor."
+            }), 400
 
-    # Fetch data based on global or user-specific search
+    # Catalog pages only change on admin inserts and library pages on the user's rating writes,
+    # so a client that already holds the current version gets a 304 without any listing queries
+    user_email = request.token_data.get('email')
     if global_search:
-        data, pagination = get_global_list(tab_type, search_query, page, per_page)
+        versions = get_versions(CATALOG_SCOPE)
+        etag = compute_etag(versions, sorted(request.args.items(multi=True)))
     else:
-        user_email = request.token_data.get('email')
-        data, pagination = get_user_list(user_email, tab_type, search_query, page, per_page)
+        versions = get_versions(CATALOG_SCOPE, user_scope(user_email))
+        etag = compute_etag(versions, user_email, sorted(request.args.items(multi=True)))
 
-    return jsonify({
-        "status": "success",
-        "data": data,
-        "pagination": pagination
-    }), 200
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        logging.info("Fetching listings - Type: %s, Global Search: %s, Query: '%s', Page: %s, Per Page: %s, Cursor: %s",
+                    tab_type, global_search, search_query, page, per_page, positions)
+
+        # Fetch data based on global or user-specific search
+        if global_search:
+            data, pagination = get_global_list(tab_type, search_query, page, per_page, positions, count_mode, filters)
+        else:
+            data, pagination = get_user_list(user_email, tab_type, search_query, page, per_page, positions, count_mode,
+                                             filters)
+
+        body = {
+            "status": "success",
+            "data": data,
+            "pagination": pagination
+        }
+        # Genre and language counts of the matching movies, for building filter menus
+        if include_facets and tab_type in ['movie', '']:
+            body["facets"] = get_listing_facets(None if global_search else user_email, search_query, filters)
+        response = jsonify(body)
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
-def get_global_list(tab_type, search_query, page, per_page):
+def get_global_list(tab_type, search_query, page, per_page, positions=None, count_mode='exact', filters=None):
     logging.info("Retrieving global list - Type: %s, Query: '%s', Page: %s, Per Page: %s",
                 tab_type, search_query, page, per_page)
 
-    data = {}
-    pagination_data = {}
+    sections = {}
+    if tab_type in ['movie', '']:
+        sections['movies'] = partial(get_global_movies, search_query, page, per_page, positions, count_mode, filters)
+    if tab_type in ['book', '']:
+        sections['books'] = partial(get_global_books, search_query, page, per_page, positions, count_mode, filters)
+
+    # The combined tab runs both sections at once, so it takes as long as the slower one
+    return merge_sections(run_sections(sections), per_page, positions)
 
-    # Retrieve Movies
+def get_user_list(email, tab_type, search_query, page, per_page, positions=None, count_mode='exact', filters=None):
+    logging.info("Retrieving user-specific list for email: %s - Type: %s, Query: '%s', Page: %s, Per Page: %s",
+                email, tab_type, search_query, page, per_page)
+
+    # Resolved here because the sections may run on worker threads outside the request
+    user_id = get_user_id(email)
+    sections = {}
     if tab_type in ['movie', '']:
+        sections['movies'] = partial(get_user_movies, email, user_id, search_query, page, per_page, positions,
+                                     count_mode, filters)
+    if tab_type in ['book', '']:
+        sections['books'] = partial(get_user_books, email, user_id, search_query, page, per_page, positions,
+                                    count_mode, filters)
+
+    return merge_sections(run_sections(sections), per_page, positions)
+
+# Combine per-section (rows, pagination) results into the listing response's data and pagination blocks
+def merge_sections(results, per_page, positions):
+    data = {section: rows for section, (rows, _) in results.items()}
+    if positions is not None:
+        return data, keyset_pagination_data({section: position for section, (_, position) in results.items()}, per_page)
+    return data, {section: pagination for section, (_, pagination) in results.items()}
+
+# Facet counts for the movies of a global (email=None) or library listing
+def get_listing_facets(email, search_query, filters):
+    if email is None:
+        movie_query = Movies.query
+        cache_key = ('movies', search_query, filters_key(filters), 'facets')
+    else:
+        movie_query = UserMovieRow.query().filter(UserMoviesWatched.user_id == get_user_id(email))
+        cache_key = ('user', email, 'facets', search_query, filters_key(filters))
+    if search_query:
+        movie_query = movie_query.filter(
+            text("MATCH(movies.title) AGAINST (:search IN BOOLEAN MODE)")
+        ).params(search=f'*{search_query}*')
+    return movie_facets(apply_movie_filters(movie_query, filters), cache_key)
+
+# Each section below builds its own query so that it can run on a worker thread with its own session,
+# selecting only the columns the response needs into lightweight rows from app.rows.
+# With positions it pages by keyset (primary key, or relevance then primary key for searches) and returns
+# the next position; otherwise it pages by offset and returns the pagination block.
+
+def get_global_movies(search_query, page, per_page, positions, count_mode, filters=None):
+    if positions is not None:
+        relevance = match_relevance('title', f'*{search_query}*') if search_query else None
+        movie_rows, pagination = keyset_section(
+            apply_movie_filters(MovieRow.query(), filters), Movies.id, per_page, positions, 'movies', relevance)
+    else:
         if search_query:
             # Use MATCH ... AGAINST with boolean mode and relevance scoring
-            movie_query = Movies.query.filter(
+            movie_query = MovieRow.query().filter(
                 text("MATCH(title) AGAINST (:search IN BOOLEAN MODE)")
             ).params(search=f'*{search_query}*')
             
@@ -80,26 +199,26 @@ def get_global_list(tab_type, search_query, page, per_page):
                 text("MATCH(title) AGAINST (:search IN BOOLEAN MODE) DESC")
             ).params(search=f'*{search_query}*')
         else:
-            movie_query = Movies.query.order_by(Movies.id)
-
-        movie_pagination: Pagination = movie_query.paginate(page=page, per_page=per_page, error_out=False)
-        movies = [movie.to_dict() for movie in movie_pagination.items]
-        total_movies = movie_pagination.total
-
-        logging.info("Retrieved %s movies", len(movies))
-        data['movies'] = movies
-        pagination_data['movies'] = {
-            "current_page": movie_pagination.page,
-            "per_page": movie_pagination.per_page,
-            "total_pages": movie_pagination.pages,
-            "total_items": movie_pagination.total
-        }
-
-    # Retrieve Books
-    if tab_type in ['book', '']:
+            movie_query = MovieRow.query().order_by(Movies.id)
+        movie_query = apply_movie_filters(movie_query, filters)
+
+        movie_rows, pagination = offset_page(
+            movie_query, page, per_page, count_mode, ('movies', search_query, filters_key(filters)),
+            None if search_query or filters else 'movies')
+
+    movies = [MovieRow(row).to_dict() for row in movie_rows]
+    logging.info("Retrieved %s movies", len(movies))
+    return movies, pagination
+
+def get_global_books(search_query, page, per_page, positions, count_mode, filters=None):
+    if positions is not None:
+        relevance = match_relevance('book_title', f'*{search_query}*') if search_query else None
+        book_rows, pagination = keyset_section(
+            apply_book_filters(BookRow.query(), filters), Books.isbn, per_page, positions, 'books', relevance)
+    else:
         if search_query:
             # Use MATCH ... AGAINST with boolean mode and relevance scoring
-            book_query = Books.query.filter(
+            book_query = BookRow.query().filter(
                 text("MATCH(book_title) AGAINST (:search IN BOOLEAN MODE)")
             ).params(search=f'*{search_query}*')
             
@@ -108,35 +227,25 @@ def get_global_list(tab_type, search_query, page, per_page):
                 text("MATCH(book_title) AGAINST (:search IN BOOLEAN MODE) DESC")
             ).params(search=f'*{search_query}*')
         else:
-            book_query = Books.query.order_by(Books.isbn)
-
-        book_pagination: Pagination = book_query.paginate(page=page, per_page=per_page, error_out=False)
-        books = [{**book.to_dict(), "id": book.to_dict().pop("isbn")} for book in book_pagination.items]
-        total_books = book_pagination.total
-
-        logging.info("Retrieved %s books", len(books))
-        data['books'] = books
-        pagination_data['books'] = {
-            "current_page": book_pagination.page,
-            "per_page": book_pagination.per_page,
-            "total_pages": book_pagination.pages,
-            "total_items": book_pagination.total
-        }
+            book_query = BookRow.query().order_by(Books.isbn)
+        book_query = apply_book_filters(book_query, filters)
 
-    return data, pagination_data
+        book_rows, pagination = offset_page(
+            book_query, page, per_page, count_mode, ('books', search_query, filters_key(filters)),
+            None if search_query or filters else 'books')
 
-def get_user_list(email, tab_type, search_query, page, per_page):
-    logging.info("Retrieving user-specific list for email: %s - Type: %s, Query: '%s', Page: %s, Per Page: %s",
-                email, tab_type, search_query, page, per_page)
+    books = [BookRow(row).to_dict() for row in book_rows]
+    logging.info("Retrieved %s books", len(books))
+    return books, pagination
 
-    data = {}
-    pagination_data = {}
-
-    # Retrieve User's Movies
-    if tab_type in ['movie', '']:
-        user_movie_query = db.session.query(UserMoviesWatched, Movies).join(Movies, UserMoviesWatched.movie_id == Movies.id)\
-            .filter(UserMoviesWatched.email == email)
+def get_user_movies(email, user_id, search_query, page, per_page, positions, count_mode, filters=None):
+    user_movie_query = apply_movie_filters(UserMovieRow.query().filter(UserMoviesWatched.user_id == user_id), filters)
 
+    if positions is not None:
+        relevance = match_relevance('movies.title', f'*{search_query}*') if search_query else None
+        user_movie_rows, pagination = keyset_section(
+            user_movie_query, UserMoviesWatched.uuid, per_page, positions, 'movies', relevance)
+    else:
         if search_query:
             user_movie_query = user_movie_query.filter(
                 text("MATCH(movies.title) AGAINST (:search IN BOOLEAN MODE)")
@@ -147,28 +256,21 @@ def get_user_list(email, tab_type, search_query, page, per_page):
                 text("MATCH(movies.title) AGAINST (:search IN BOOLEAN MODE) DESC")
             ).params(search=f'*{search_query}*')
 
-        user_movie_pagination: Pagination = user_movie_query.paginate(page=page, per_page=per_page, error_out=False)
-        user_movies = [
-            {**movie.to_dict(), "user_rating": user_movie.user_rating}
-            for user_movie, movie in user_movie_pagination.items
-        ]
-        total_movies = user_movie_pagination.total
-
-        logging.info("Retrieved %s user-specific movies", len(user_movies))
-        data['movies'] = user_movies
-        pagination_data['movies'] = {
-            "current_page": user_movie_pagination.page,
-            "per_page": user_movie_pagination.per_page,
-            "total_pages": user_movie_pagination.pages,
-            "total_items": user_movie_pagination.total
-        }
+        user_movie_rows, pagination = offset_page(
+            user_movie_query, page, per_page, count_mode, ('user', email, 'movies', search_query, filters_key(filters)))
 
-    # Retrieve User's Books
-    if tab_type in ['book', '']:
-        user_book_query = db.session.query(UserBooksRead, Books) \
-            .join(Books, UserBooksRead.isbn == Books.isbn) \
-            .filter(UserBooksRead.email == email)
+    user_movies = [UserMovieRow(row).to_dict() for row in user_movie_rows]
+    logging.info("Retrieved %s user-specific movies", len(user_movies))
+    return user_movies, pagination
+
+def get_user_books(email, user_id, search_query, page, per_page, positions, count_mode, filters=None):
+    user_book_query = apply_book_filters(UserBookRow.query().filter(UserBooksRead.user_id == user_id), filters)
 
+    if positions is not None:
+        relevance = match_relevance('books.book_title', f'*{search_query}*') if search_query else None
+        user_book_rows, pagination = keyset_section(
+            user_book_query, UserBooksRead.uuid, per_page, positions, 'books', relevance)
+    else:
         if search_query:
             user_book_query = user_book_query.filter(
                 text("MATCH(books.book_title) AGAINST (:search IN BOOLEAN MODE)")
@@ -179,27 +281,44 @@ def get_user_list(email, tab_type, search_query, page, per_page):
                 text("MATCH(books.book_title) AGAINST (:search IN BOOLEAN MODE) DESC")
             ).params(search=f'*{search_query}*')
 
-        user_book_pagination: Pagination = user_book_query.paginate(page=page, per_page=per_page, error_out=False)
-        user_books = [
-            {
-                **{**book.to_dict(), "id": book.to_dict().pop("isbn")},
-                "user_rating": user_book.user_rating
-            }
-            for user_book, book in user_book_pagination.items
-        ]
-
-        total_books = user_book_pagination.total
-
-        logging.info("Retrieved %s user-specific books", len(user_books))
-        data['books'] = user_books
-        pagination_data['books'] = {
-            "current_page": user_book_pagination.page,
-            "per_page": user_book_pagination.per_page,
-            "total_pages": user_book_pagination.pages,
-            "total_items": user_book_pagination.total
-        }
+        user_book_rows, pagination = offset_page(
+            user_book_query, page, per_page, count_mode, ('user', email, 'books', search_query, filters_key(filters)))
+
+    user_books = [UserBookRow(row).to_dict() for row in user_book_rows]
+    logging.info("Retrieved %s user-specific books", len(user_books))
+    return user_books, pagination
+
+# Drop every cached value derived from a user's ratings after a rating write
+def ratings_changed(user_email):
+    invalidate_user_recommendations(user_email)
+    invalidate_user_counts(user_email)
+    bump_versions(user_scope(user_email))
+    pin_reads_to_primary()
+
+# Endpoint for search-box autocomplete, served from the in-memory title index without touching MySQL
+@main.route('/api/suggest', methods=['GET'])
+@user_required
+def suggest_titles():
+    prefix = request.args.get('q', '').strip()
+    tab_type = request.args.get('type', '')
 
-    return data, pagination_data
+    try:
+        limit = int(request.args.get('limit', 10))
+        if limit < 1 or limit > 50:
+            raise ValueError
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "Invalid limit. 'limit' must be an integer between 1 and 50."
+        }), 400
+
+    index = current_app.extensions['title_index']
+    index.ensure_fresh(current_app._get_current_object())
+
+    return jsonify({
+        "status": "success",
+        "data": index.search(prefix, tab_type, limit)
+    }), 200
 
 #Endpoint to add a movie or book to user's watched/read list with a rating
 @main.route('/api/reviews', methods=['POST'])
@@ -213,17 +332,15 @@ def add_item_to_user():
 
     # Get user email from token
     user_email = request.token_data.get('email')
+    user_id = get_user_id(user_email)
+    if user_id is None:
+        return jsonify({'error': 'User not found'}), 404
 
     # Add movie to user's watched list
     if data['itemType'] == 'movie':
-        # Check for existing entry to prevent duplicates
-        existing_entry = UserMoviesWatched.query.filter_by(email=user_email, movie_id=data['itemId']).first()
-        if existing_entry:
-            return jsonify({'error': 'Movie is already present in the database for this user. Cannot enter again.'}), 400
-
         # Create new movie entry
         new_entry = UserMoviesWatched(
-            email=user_email,
+            user_id=user_id,
             movie_id=data['itemId'],
             user_rating=data['rating']
         )
@@ -231,15 +348,10 @@ def add_item_to_user():
 
     # Add book to user's read list
     elif data['itemType'] == 'book':
-        # Check for existing entry to prevent duplicates
-        existing_entry = UserBooksRead.query.filter_by(email=user_email, isbn=data['itemId']).first()
-        if existing_entry:
-            return jsonify({'error': 'Book is already present in the database for this user. Cannot enter again.'}), 400
-
         logging.info("Adding item ", data['itemId'])
         # Create new book entry
         new_entry = UserBooksRead(
-            email=user_email,
+            user_id=user_id,
             isbn=data['itemId'],
             user_rating=data['rating']
         )
@@ -248,21 +360,204 @@ def add_item_to_user():
     else:
         return jsonify({'error': 'Invalid item type specified'}), 400
 
-    # Commit the new entry to the database
-    db.session.commit()
+    # Insert the new entry and count it in one transaction; the unique key on (user_id, item)
+    # rejects duplicates, so no lookup is needed beforehand
+    try:
+        adjust_rating_count(user_id, data['itemType'], 1)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        model, item_column, _, _ = RATING_TABLES[data['itemType']]
+        if model.query.filter(model.user_id == user_id, item_column == data['itemId']).first() is None:
+            return jsonify({'error': 'Item not found'}), 404
+        return jsonify({
+            'error': f"{data['itemType'].capitalize()} is already present in the database for this user. Cannot enter again."
+        }), 400
+    ratings_changed(user_email)
 
     return jsonify({
         "status": "success",
         "message": f"{data['itemType'].capitalize()} has been added to the user's database.",
         "data": {
             "uuid": new_entry.uuid,
-            "email": new_entry.email,
+            "email": user_email,
             "item_id": data['itemId'],
             "user_rating": new_entry.user_rating
         }
     }), 200
 
 
+# Maximum number of ratings accepted by one batch request
+MAX_BATCH_REVIEWS = 500
+
+# Rating tables and the catalog column each one references, per item type
+RATING_TABLES = {
+    'movie': (UserMoviesWatched, UserMoviesWatched.movie_id, Movies.id, 'movie_id'),
+    'book': (UserBooksRead, UserBooksRead.isbn, Books.isbn, 'isbn'),
+}
+
+REVIEW_ERROR = 'itemId, itemType (movie|book) and a rating between 1 and 5 are required'
+
+def parse_review(review):
+    """Validate a {"itemId", "itemType", "rating"} entry and return (item type, item id, rating)."""
+    try:
+        item_type = review['itemType']
+        item_id = int(review['itemId'])
+        rating = int(review['rating'])
+        valid = item_type in RATING_TABLES and not isinstance(review['rating'], bool) and 1 <= rating <= 5
+    except (AttributeError, KeyError, TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise ValueError(REVIEW_ERROR)
+    return item_type, item_id, rating
+
+# Endpoint to add or replace a rating in one statement
+@main.route('/api/reviews', methods=['PUT'])
+@user_required
+def upsert_item_rating():
+    """
+    Set the user's rating for a movie or book, adding it if it is not rated yet.
+
+    Expects {"itemId", "itemType", "rating"}. Written as one INSERT ... ON DUPLICATE
+    KEY UPDATE (ON CONFLICT DO UPDATE on SQLite) against the unique key on
+    (user_id, item), so concurrent writes from several tabs cannot race.
+    """
+    try:
+        item_type, item_id, rating = parse_review(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    user_email = request.token_data.get('email')
+    user_id = get_user_id(user_email)
+    if user_id is None:
+        return jsonify({'error': 'User not found'}), 404
+
+    model, _, _, field = RATING_TABLES[item_type]
+    try:
+        upsert_rows(model, [{'user_id': user_id, field: item_id, 'user_rating': rating}],
+                    update_columns=['user_rating'], conflict_columns=['user_id', field])
+        # The upsert does not say whether it inserted, so the counter is recounted
+        recount_ratings(user_id, item_type)
+        db.session.commit()
+    except IntegrityError:
+        # Only the catalog foreign key can fail once the rating is validated
+        db.session.rollback()
+        return jsonify({'error': 'Item not found'}), 404
+    ratings_changed(user_email)
+
+    return jsonify({
+        "status": "success",
+        "message": f"{item_type.capitalize()} rating has been saved to the user's database.",
+        "data": {
+            "email": user_email,
+            "item_id": item_id,
+            "user_rating": rating
+        }
+    }), 200
+
+#Endpoint to add many movie and book ratings at once, e.g. during onboarding
+@main.route('/api/reviews/batch', methods=['POST'])
+@user_required
+def add_items_to_user():
+    """
+    Add a batch of ratings in a single transaction.
+
+    Expects {"reviews": [{"itemId", "itemType", "rating"}, ...]}. Every entry gets
+    an outcome: 'added', 'duplicate' (already rated, or repeated in the batch),
+    'not_found' (no such catalog item) or 'invalid'.
+    """
+    data = request.get_json(silent=True) or {}
+    reviews = data.get('reviews') if isinstance(data, dict) else None
+    if not isinstance(reviews, list) or not reviews:
+        return jsonify({'error': "'reviews' must be a non-empty list"}), 400
+    if len(reviews) > MAX_BATCH_REVIEWS:
+        return jsonify({'error': f'At most {MAX_BATCH_REVIEWS} reviews can be submitted at once'}), 400
+
+    user_email = request.token_data.get('email')
+    user_id = get_user_id(user_email)
+    if user_id is None:
+        return jsonify({'error': 'User not found'}), 404
+    results = []
+    pending = {'movie': {}, 'book': {}}
+
+    # Validate every entry and drop repeats within the batch
+    for index, review in enumerate(reviews):
+        result = {'index': index}
+        results.append(result)
+        if isinstance(review, dict):
+            result['itemId'] = review.get('itemId')
+            result['itemType'] = review.get('itemType')
+        try:
+            item_type, item_id, rating = parse_review(review)
+        except ValueError as e:
+            result.update(status='invalid', error=str(e))
+            continue
+
+        if item_id in pending[item_type]:
+            result['status'] = 'duplicate'
+            continue
+        pending[item_type][item_id] = (rating, result)
+
+    # One query per type finds which items exist and which the user has already rated
+    inserted = 0
+    for item_type, entries in pending.items():
+        if not entries:
+            continue
+        model, item_column, catalog_key, field = RATING_TABLES[item_type]
+        rows = db.session.query(catalog_key, model.uuid)\
+            .outerjoin(model, and_(item_column == catalog_key, model.user_id == user_id))\
+            .filter(catalog_key.in_(list(entries))).all()
+        rated = {item_id: uuid is not None for item_id, uuid in rows}
+
+        values, added_results = [], []
+        for item_id, (rating, result) in entries.items():
+            if item_id not in rated:
+                result['status'] = 'not_found'
+            elif rated[item_id]:
+                result['status'] = 'duplicate'
+            else:
+                result['status'] = 'added'
+                values.append({'user_id': user_id, field: item_id, 'user_rating': rating})
+                added_results.append(result)
+        if not values:
+            continue
+
+        # One multi-row INSERT; a rating written concurrently since the lookup is skipped by the unique key
+        conflict_columns = ['user_id', field]
+        savepoint = db.session.begin_nested()
+        added = upsert_rows(model, values, update_columns=[], conflict_columns=conflict_columns)
+        if added < len(values):
+            # Redo the batch row by row to find out which entries were skipped
+            savepoint.rollback()
+            added, skipped = 0, {}
+            for value, result in zip(values, added_results):
+                if upsert_rows(model, [value], update_columns=[], conflict_columns=conflict_columns):
+                    added += 1
+                else:
+                    skipped[value[field]] = result
+            # MySQL's INSERT IGNORE also skips items removed from the catalog since the lookup
+            existing = {item_id for item_id, in db.session.query(catalog_key)
+                        .filter(catalog_key.in_(list(skipped))).all()}
+            for item_id, result in skipped.items():
+                result['status'] = 'duplicate' if item_id in existing else 'not_found'
+        else:
+            savepoint.commit()
+        adjust_rating_count(user_id, item_type, added)
+        inserted += added
+
+    if inserted:
+        db.session.commit()
+        ratings_changed(user_email)
+
+    return jsonify({
+        "status": "success",
+        "message": f"{inserted} of {len(reviews)} ratings have been added to the user's database.",
+        "data": {
+            "added": inserted,
+            "results": results
+        }
+    }), 200
+
 # Endpoint to delete a movie or book from user's watched/read list
 @main.route('/api/<type>s/<id>', methods=['DELETE'])
 @user_required
@@ -273,20 +568,23 @@ def delete_item(id,type):
     # Get user email from token
     user_email = request.token_data.get('email') 
 
-    # Find the entry to delete based on item type
-    entry_to_delete = None
+    # Delete the entry with a single DELETE based on item type
+    deleted = 0
     if type == 'movie':
-        entry_to_delete = UserMoviesWatched.query.filter_by(email=user_email, movie_id=id).first()
+        deleted = UserMoviesWatched.query.filter_by(user_id=get_user_id(user_email), movie_id=id)\
+            .delete(synchronize_session=False)
     elif type == 'book':
-        entry_to_delete = UserBooksRead.query.filter_by(email=user_email, isbn=id).first()
+        deleted = UserBooksRead.query.filter_by(user_id=get_user_id(user_email), isbn=id)\
+            .delete(synchronize_session=False)
 
     # Return error if no matching entry found
-    if not entry_to_delete:
+    if not deleted:
         return jsonify({'error': 'No matching entry found for this user and item'}), 404
 
-    # Delete the entry and commit changes
-    db.session.delete(entry_to_delete)
+    # Uncount the entry and commit changes
+    adjust_rating_count(get_user_id(user_email), type, -deleted)
     db.session.commit()
+    ratings_changed(user_email)
 
     return jsonify({
         "status": "success",
@@ -302,6 +600,7 @@ def get_user_items(user_email, tab_type):
         # Get user age from the User table
         user = User.query.filter_by(email=user_email).first()
         user_age = user.age if user else None
+        user_id = user.id if user else None
         
         # Retrieve movies if tab type is 'all' or 'movie'
         if tab_type in ['all', 'movie']:
@@ -310,7 +609,7 @@ def get_user_items(user_email, tab_type):
             ).join(
                 Movies, UserMoviesWatched.movie_id == Movies.id
             ).filter(
-                UserMoviesWatched.email == user_email
+                UserMoviesWatched.user_id == user_id
             ).all()
             
             # Prepare movie items with relevant details
@@ -331,7 +630,7 @@ def get_user_items(user_email, tab_type):
             ).join(
                 Books, UserBooksRead.isbn == Books.isbn
             ).filter(
-                UserBooksRead.email == user_email
+                UserBooksRead.user_id == user_id
             ).all()
             
             # Prepare book items with relevant details
@@ -374,38 +673,33 @@ def update_item_rating(id, type):
         
         # Determine which table to update based on type
         if type == 'movie':
-            # Find the specific user's movie entry
-            entry_to_update = UserMoviesWatched.query.filter_by(
-                email=user_email, 
+            # Update the specific user's movie entry with a single UPDATE
+            updated = UserMoviesWatched.query.filter_by(
+                user_id=get_user_id(user_email),
                 movie_id=id
-            ).first()
+            ).update({'user_rating': user_rating}, synchronize_session=False)
             
             # Check if entry exists
-            if not entry_to_update:
+            if not updated:
                 return jsonify({'error': 'No matching movie entry found for this user'}), 404
             
-            # Update the rating
-            entry_to_update.user_rating = user_rating
-            
         elif type == 'book':
-            # Find the specific user's book entry
-            entry_to_update = UserBooksRead.query.filter_by(
-                email=user_email, 
+            # Update the specific user's book entry with a single UPDATE
+            updated = UserBooksRead.query.filter_by(
+                user_id=get_user_id(user_email),
                 isbn=id
-            ).first()
+            ).update({'user_rating': user_rating}, synchronize_session=False)
             
             # Check if entry exists
-            if not entry_to_update:
+            if not updated:
                 return jsonify({'error': 'No matching book entry found for this user'}), 404
-            
-            # Update the rating
-            entry_to_update.user_rating = user_rating
         
         else:
             return jsonify({'error': 'Invalid item type'}), 400
         
         # Commit the changes
         db.session.commit()
+        ratings_changed(user_email)
         
         # Return success response
         return jsonify({
@@ -425,14 +719,43 @@ def update_item_rating(id, type):
         return jsonify({'error': str(e)}), 500
 
 
-# Endpoint to generate personalized recommendations using OpenAI's GPT
+# Helper function to get the shared OpenAI client with the app's settings
+def get_llm_client():
+    return get_openai_client(
+        timeout=current_app.config['OPENAI_TIMEOUT'],
+        max_retries=current_app.config['OPENAI_MAX_RETRIES']
+    )
+
+# Helper function to run the local item-item engine with the app's settings
+def get_local_recommendations(user_email, tab_type, limit=10):
+    return recommend_for_user(
+        user_email,
+        tab_type,
+        limit=limit,
+        max_age=current_app.config['RECOMMENDER_MODEL_TTL'],
+        neighbors=current_app.config['RECOMMENDER_NEIGHBORS']
+    )
+
+# Endpoint to generate personalized recommendations
+# engine=llm uses OpenAI's GPT, engine=local the built-in item-item model,
+# and engine=hybrid serves local results topped up by the LLM
 @main.route('/api/generate-recommendation', methods=['GET'])
 @user_required
+@read_only
 def generate_recommendations():
     try:
-        # Retrieve OpenAI API key from environment
-        api_key = os.getenv('OPENAI_API_KEY')
-        client = OpenAI(api_key=api_key)
+        # Determine which recommendation engine to use
+        engine = request.args.get('engine', current_app.config['RECOMMENDER_ENGINE']).lower()
+        if engine not in ENGINES:
+            return jsonify({
+                "status": "error",
+                "message": f"Invalid engine. Must be one of: {', '.join(ENGINES)}"
+            }), 400
+
+        # Only the LLM-backed engines need an OpenAI client
+        client = None
+        if engine != 'local':
+            client = get_llm_client()
         
         # Determine recommendation type (movies, books, or all)
         tab_type = request.args.get('type', 'all').lower()
@@ -448,6 +771,13 @@ def generate_recommendations():
         if not user_email:
             return jsonify({"status": "error", "message": "User email not found"}), 401
 
+        # Local engine scores catalog items directly from the rating tables
+        if engine == 'local':
+            return jsonify({
+                "status": "success",
+                "data": get_local_recommendations(user_email, tab_type)
+            }), 200
+
         # Retrieve user's watched/read items and age
         user_items, user_age = get_user_items(user_email, tab_type)
         # Return empty list if no items found
@@ -457,54 +787,34 @@ def generate_recommendations():
                 "data": []
             }), 200
 
-        # Prepare age-specific content guidance for recommendations
-        age_guidance = ""
-        if user_age:
-            if user_age < 13:
-                # Guidance for children
-                age_guidance = "Please ensure all recommendations are appropriate for children under 13. Focus on family-friendly content."
-            elif user_age < 18:
-                # Guidance for teenagers
-                age_guidance = "Please ensure all recommendations are appropriate for teenagers. Avoid mature or explicit content."
-            else:
-                # Guidance for adult users
-                age_guidance = f"The user is {user_age} years old. Consider age-appropriate content and themes that might resonate with this age group."
-
-        # Call OpenAI API to generate personalized recommendations
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a recommendation system expert."},
-                {"role": "user", "content": f"""Based on the user's ratings, preferences, and age shown below, generate personalized recommendations.
-                Focus on {tab_type} recommendations. Sort the recommendations based on confidence.
-                
-                User's age context: {age_guidance}
-                
-                User's history:
-                {json.dumps(user_items, indent=2)}
-                
-                Return exactly 10 recommendations in the below JSON format. Please be very careful with this JSON format. I am reading this JSON format
-                programmatically, so if format is not correct, everything will fail. Your response should be just like a JSON response of an API call. Assume
-                you are an API returning JSON.
-                {{"recommendations": [
-                    {{
-                        "type": "movie"|"book",
-                        "title": string,
-                        "confidence": float (0-1),
-                        "description": string,
-                        "genre": string,
-                        "cast": [string] (for movies),
-                        "author": string (for books)
-                    }}
-                ]}}"""}
-            ],
-            temperature=0.7,
-            max_tokens=2000
-        )
+        # Serve from cache while the user's history, tab and age bucket are unchanged
+        cache_key = recommendation_cache_key(user_email, user_items, tab_type, user_age, engine)
+        cached = recommendation_cache.get(cache_key)
+        if cached is not None:
+            return jsonify({
+                "status": "success",
+                "data": cached
+            }), 200
 
-        # Parse the OpenAI API response
-        result = json.loads(response.choices[0].message.content)
-        recommendations = result.get('recommendations', [])
+        # Serve lists precomputed by the batch job while the history they were built from is unchanged
+        precomputed = get_precomputed_recommendations(user_email, tab_type, engine, user_items, user_age)
+        if precomputed is not None:
+            recommendation_cache.set(cache_key, precomputed)
+            return jsonify({
+                "status": "success",
+                "data": precomputed
+            }), 200
+
+        # Hybrid engine starts from the local results and only asks the LLM to fill the gap
+        recommendations = []
+        if engine == 'hybrid':
+            recommendations = get_local_recommendations(user_email, tab_type)
+
+        if len(recommendations) < 10:
+            llm_items = get_llm_recommendations(client, user_items, user_age, tab_type)
+            recommendations = merge_recommendations(recommendations, llm_items)
+
+        recommendation_cache.set(cache_key, recommendations[:10])
 
         # Return recommendations
         return jsonify({
@@ -521,6 +831,89 @@ def generate_recommendations():
         }), 500
     
 
+# Format one Server-Sent Event
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+# Endpoint to stream personalized recommendations over Server-Sent Events
+# Each recommendation is pushed as soon as the model has finished writing it
+@main.route('/api/generate-recommendation/stream', methods=['GET'])
+@user_required
+@read_only
+def stream_recommendations():
+    # Determine which recommendation engine to use
+    engine = request.args.get('engine', current_app.config['RECOMMENDER_ENGINE']).lower()
+    if engine not in ENGINES:
+        return jsonify({
+            "status": "error",
+            "message": f"Invalid engine. Must be one of: {', '.join(ENGINES)}"
+        }), 400
+
+    # Determine recommendation type (movies, books, or all)
+    tab_type = request.args.get('type', 'all').lower()
+    if tab_type == 'movies':
+        tab_type = 'movie'
+    elif tab_type == 'books':
+        tab_type = 'book'
+
+    # Get user email from token
+    user_email = request.token_data.get('email')
+    if not user_email:
+        return jsonify({"status": "error", "message": "User email not found"}), 401
+
+    # Resolve everything that needs the database before the response starts streaming
+    user_items, user_age = get_user_items(user_email, tab_type)
+    cache_key = recommendation_cache_key(user_email, user_items, tab_type, user_age, engine)
+    cached = recommendation_cache.get(cache_key) if user_items else None
+    local_items = []
+    if engine in ['local', 'hybrid'] and cached is None:
+        local_items = get_local_recommendations(user_email, tab_type)
+    timeout = current_app.config['OPENAI_TIMEOUT']
+    max_retries = current_app.config['OPENAI_MAX_RETRIES']
+
+    def generate():
+        sent = []
+        try:
+            if cached is not None:
+                for item in cached:
+                    sent.append(item)
+                    yield sse_event('recommendation', item)
+            else:
+                for item in local_items:
+                    sent.append(item)
+                    yield sse_event('recommendation', item)
+
+                if engine != 'local' and user_items and len(sent) < 10:
+                    client = get_openai_client(timeout=timeout, max_retries=max_retries)
+                    messages = build_recommendation_messages(user_items, get_age_guidance(user_age), tab_type)
+                    seen_titles = {item['title'].lower() for item in sent}
+                    for item in stream_llm_recommendations(client, messages):
+                        if len(sent) >= 10:
+                            break
+                        if str(item.get('title', '')).lower() in seen_titles:
+                            continue
+                        sent.append(item)
+                        yield sse_event('recommendation', item)
+
+                if user_items and engine != 'local':
+                    recommendation_cache.set(cache_key, sent)
+
+            yield sse_event('done', {"status": "success", "count": len(sent)})
+
+        except Exception as e:
+            # Headers are already sent, so report the failure as an event
+            logging.error(f"Error streaming recommendations: {str(e)}")
+            yield sse_event('error', {
+                "status": "error",
+                "message": f"Failed to generate recommendations: {str(e)}"
+            })
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # Endpoint to add a new movie to the database (admin-only)
 @main.route('/api/movies', methods=['POST'])
 @admin_required
@@ -553,10 +946,16 @@ def add_movie():
             genres=data['genres'],
             poster_path=data.get('poster_path')  # Optional poster path
         )
+        movie.content_hash = movie_content_hash(movie.to_dict())
         
-        # Add and commit the new movie to the database
+        # Add and commit the new movie to the database, with its genre and cast rows
         db.session.add(movie)
+        db.session.flush()
+        replace_movie_facets([movie.to_dict()])
         db.session.commit()
+        catalog_count_changed('movies')
+        bump_versions(CATALOG_SCOPE)
+        current_app.extensions['title_index'].add('movie', movie.id, movie.title)
         
         # Return success response with movie data
         return jsonify({
@@ -602,6 +1001,9 @@ def add_book():
         # Add and commit the new book to the database
         db.session.add(book)
         db.session.commit()
+        catalog_count_changed('books')
+        bump_versions(CATALOG_SCOPE)
+        current_app.extensions['title_index'].add('book', book.isbn, book.book_title)
         
         # Return success response with book data
         return jsonify({
@@ -614,6 +1016,65 @@ def add_book():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+# Endpoint to bulk upsert movies or books from a CSV or JSONL upload (admin-only)
+@main.route('/api/admin/import/<section>', methods=['POST'])
+@admin_required
+def import_catalog_upload(section):
+    """
+    Stream an upload into the catalog in chunks.
+
+    The file is sent either as multipart field 'file' or as the raw request
+    body; the format comes from ?format=csv|jsonl, else the file name or content type.
+    """
+    if section not in CATALOG_SECTIONS:
+        return jsonify({'error': 'Invalid section. Must be movies or books'}), 400
+
+    upload = request.files.get('file')
+    if upload is not None:
+        binary, filename, content_type = upload.stream, upload.filename, upload.mimetype
+    else:
+        binary, filename, content_type = request.stream, None, request.mimetype
+
+    fmt = request.args.get('format') or detect_format(filename, content_type)
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': f"Invalid format. Must be one of: {', '.join(IMPORT_FORMATS)}"}), 400
+
+    try:
+        chunk_size = int(request.args.get('chunk_size', 1000))
+        if chunk_size < 1 or chunk_size > 5000:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': "'chunk_size' must be an integer between 1 and 5000"}), 400
+
+    # Decode the upload line by line as it is read instead of loading it into memory
+    stream = codecs.iterdecode(binary, 'utf-8-sig')
+    try:
+        summary = import_catalog(section, stream, fmt, chunk_size)
+    except UnicodeDecodeError as e:
+        db.session.rollback()
+        return jsonify({'error': f'Upload is not valid UTF-8: {str(e)}'}), 400
+
+    return jsonify({
+        "status": "success",
+        "data": summary
+    }), 200
+
+# Endpoint to report in-process cache statistics (admin-only)
+@main.route('/api/admin/stats', methods=['GET'])
+@admin_required
+def get_stats():
+    return jsonify({
+        "status": "success",
+        "data": {
+            "recommendation_cache": recommendation_cache.stats(),
+            "claims_cache": current_app.extensions['claims_cache'].stats(),
+            "profile_cache": current_app.extensions['profile_cache'].stats(),
+            "count_cache": current_app.extensions['count_cache'].stats(),
+            "db_pool": pool_stats(db.engine),
+            "read_replicas": replica_stats()
+        }
+    }), 200
+
 # Error handler for 404 Not Found errors
 @main.errorhandler(404)
 def not_found_error(error):
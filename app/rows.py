@@ -0,0 +1,99 @@
+from app.extensions import db
+from app.models import Movies, Books, UserMoviesWatched, UserBooksRead
+
+
+class ProjectedRow:
+    """
+    Lightweight, read-only row selected column by column instead of as an ORM entity.
+
+    Listing endpoints only serialize what they read, so loading full entities
+    into the session's identity map is wasted work. Subclasses name their
+    fields in __slots__ and list every field and its column in the same order.
+    """
+    __slots__ = ()
+
+    # All fields of the row (including inherited ones) and the columns they are selected from
+    fields = ()
+    columns = ()
+
+    def __init__(self, values):
+        for name, value in zip(self.fields, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def query(cls):
+        """Return a query selecting just this row's columns."""
+        return db.session.query(*cls.columns)
+
+
+class MovieRow(ProjectedRow):
+    """Movie fields shown in listings."""
+    __slots__ = fields = ('id', 'title', 'release_date', 'original_language', 'genres', 'cast', 'director', 'poster_path')
+    columns = (Movies.id, Movies.title, Movies.release_date, Movies.original_language,
+               Movies.genres, Movies.cast, Movies.director, Movies.poster_path)
+
+    def to_dict(self):
+        """Return the listing JSON shape, identical to Movies.to_dict()."""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'release_date': self.release_date,
+            'original_language': self.original_language,
+            'genres': self.genres,
+            'cast': self.cast,
+            'director': self.director,
+            'poster_path': self.poster_path,
+            'type': 'movie'
+        }
+
+
+class BookRow(ProjectedRow):
+    """Book fields shown in listings."""
+    __slots__ = fields = ('isbn', 'book_title', 'book_author', 'year_of_publication', 'image_url_s')
+    columns = (Books.isbn, Books.book_title, Books.book_author, Books.year_of_publication, Books.image_url_s)
+
+    def to_dict(self):
+        """Return the listing JSON shape: Books.to_dict() plus the ISBN repeated as 'id'."""
+        return {
+            'id': self.isbn,
+            'isbn': self.isbn,
+            'book_title': self.book_title,
+            'book_author': self.book_author,
+            'year_of_publication': self.year_of_publication,
+            'image_url_s': self.image_url_s,
+            'type': 'book'
+        }
+
+
+class UserMovieRow(MovieRow):
+    """Movie in a user's library together with the user's rating."""
+    __slots__ = ('user_rating',)
+    fields = MovieRow.fields + __slots__
+    columns = MovieRow.columns + (UserMoviesWatched.user_rating,)
+
+    @classmethod
+    def query(cls):
+        return super().query().select_from(UserMoviesWatched)\
+            .join(Movies, UserMoviesWatched.movie_id == Movies.id)
+
+    def to_dict(self):
+        data = super().to_dict()
+        data['user_rating'] = self.user_rating
+        return data
+
+
+class UserBookRow(BookRow):
+    """Book in a user's library together with the user's rating."""
+    __slots__ = ('user_rating',)
+    fields = BookRow.fields + __slots__
+    columns = BookRow.columns + (UserBooksRead.user_rating,)
+
+    @classmethod
+    def query(cls):
+        return super().query().select_from(UserBooksRead)\
+            .join(Books, UserBooksRead.isbn == Books.isbn)
+
+    def to_dict(self):
+        data = super().to_dict()
+        data['user_rating'] = self.user_rating
+        return data
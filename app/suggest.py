@@ -0,0 +1,179 @@
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from itertools import islice
+
+from app.extensions import db
+from app.models import Movies, Books
+
+# Collapses everything that is not a letter or digit into single spaces
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_title(title):
+    """Lowercase, strip accents and punctuation so 'Amélie!' and 'amelie' match."""
+    decomposed = unicodedata.normalize('NFKD', title or '')
+    ascii_title = decomposed.encode('ascii', 'ignore').decode('ascii').lower()
+    return _NON_ALNUM.sub(' ', ascii_title).strip()
+
+
+class TitleIndex:
+    """
+    In-memory sorted index of catalog titles for prefix autocomplete.
+
+    Entries are (normalized title, id, title) tuples kept sorted per type, so a
+    prefix lookup is a binary search followed by a short scan. Rebuilds swap in
+    new lists and single adds insert in place under the lock, so readers search
+    without locking; a search racing an add may miss or repeat that one title.
+    """
+
+    def __init__(self, max_age=600):
+        # Seconds before the index is rebuilt from the database in the background
+        self.max_age = max_age
+
+        self._entries = {'movie': [], 'book': []}
+        # Entry of each id, to find the one an add replaces without scanning the list
+        self._by_id = {'movie': {}, 'book': {}}
+        # Adds made while a build loads its snapshot, replayed onto it; None when no build runs
+        self._added_during_build = None
+        self._built_at = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+
+    @property
+    def built(self):
+        return self._built_at is not None
+
+    def build(self):
+        """Load every movie and book title from the database. Requires an app context."""
+        started = time.time()
+        with self._lock:
+            self._added_during_build = []
+        try:
+            movies = sorted(
+                (normalize_title(title), movie_id, title)
+                for movie_id, title in db.session.query(Movies.id, Movies.title).yield_per(10000)
+            )
+            books = sorted(
+                (normalize_title(title), isbn, title)
+                for isbn, title in db.session.query(Books.isbn, Books.book_title).yield_per(10000)
+            )
+        except Exception:
+            with self._lock:
+                self._added_during_build = None
+            raise
+        entries = {'movie': movies, 'book': books}
+        by_id = {kind: {entry[1]: entry for entry in items} for kind, items in entries.items()}
+
+        with self._lock:
+            # The snapshot may predate titles added meanwhile, so they are applied on top of it
+            for item_type, entry in self._added_during_build:
+                self._insert(entries[item_type], by_id[item_type], entry)
+            self._added_during_build = None
+            self._entries, self._by_id = entries, by_id
+            self._built_at = time.time()
+
+        logging.info("Built title index with %s movies and %s books in %.1f ms",
+                     len(movies), len(books), (time.time() - started) * 1000)
+
+    def add(self, item_type, item_id, title):
+        """Insert or replace a single title, e.g. after an admin adds it to the catalog."""
+        entry = (normalize_title(title), item_id, title)
+        with self._lock:
+            self._insert(self._entries[item_type], self._by_id[item_type], entry)
+            if self._added_during_build is not None:
+                self._added_during_build.append((item_type, entry))
+
+    @staticmethod
+    def _insert(entries, by_id, entry):
+        """Insert entry into a sorted list in place, dropping the entry it replaces."""
+        previous = by_id.get(entry[1])
+        if previous is not None:
+            index = bisect.bisect_left(entries, previous)
+            if index < len(entries) and entries[index] == previous:
+                del entries[index]
+        bisect.insort(entries, entry)
+        by_id[entry[1]] = entry
+
+    def invalidate(self):
+        """Mark the index stale so the next search triggers a background rebuild."""
+        if self.built:
+            self._built_at = 0
+
+    def _prefix_matches(self, item_type, prefix):
+        entries = self._entries[item_type]
+        index = bisect.bisect_left(entries, (prefix,))
+        while index < len(entries) and entries[index][0].startswith(prefix):
+            normalized, item_id, title = entries[index]
+            yield normalized, item_type, item_id, title
+            index += 1
+
+    def search(self, prefix, item_type='', limit=10):
+        """
+        Return up to limit titles starting with prefix, in alphabetical order.
+
+        Args:
+        - prefix: Raw user input; it is normalized the same way as the titles
+        - item_type: 'movie', 'book' or '' for both
+        - limit: Maximum number of suggestions
+        """
+        prefix = normalize_title(prefix)
+        if not prefix:
+            return []
+
+        types = [item_type] if item_type in self._entries else list(self._entries)
+        matches = heapq.merge(*(self._prefix_matches(kind, prefix) for kind in types))
+        return [
+            {'id': item_id, 'title': title, 'type': kind}
+            for _, kind, item_id, title in islice(matches, limit)
+        ]
+
+    def ensure_fresh(self, app):
+        """
+        Build the index on first use and refresh it in the background once stale.
+
+        Other workers' admin inserts only reach this process through the refresh.
+        """
+        if not self.built:
+            with self._build_lock:
+                if not self.built:
+                    with app.app_context():
+                        self.build()
+            return
+
+        if time.time() - self._built_at < self.max_age or self._rebuilding:
+            return
+
+        self._rebuilding = True
+
+        def rebuild():
+            try:
+                with app.app_context():
+                    self.build()
+            except Exception as e:
+                logging.error(f"Error rebuilding title index: {str(e)}")
+            finally:
+                self._rebuilding = False
+
+        threading.Thread(target=rebuild, name='title-index-rebuild', daemon=True).start()
+
+
+def init_app(app):
+    """Create the title index for an application and optionally build it at startup."""
+    index = TitleIndex(max_age=app.config['SUGGEST_INDEX_TTL'])
+    app.extensions['title_index'] = index
+
+    if app.config['SUGGEST_BUILD_ON_STARTUP']:
+        def warm():
+            # Builds under the same lock as the first request, so the two never load the titles twice
+            try:
+                index.ensure_fresh(app)
+            except Exception as e:
+                logging.warning(f"Could not build title index at startup: {str(e)}")
+
+        threading.Thread(target=warm, name='title-index-warmup', daemon=True).start()
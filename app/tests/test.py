@@ -1,3 +1,4 @@
+import threading
 import pytest
 from app import create_app
 from app.extensions import db
@@ -65,6 +66,9 @@ def create_test_token(email='test@example.com', roles=None):
     }
     return jwt.encode(token_data, 'test-key', algorithm='HS256')
 
+def get_test_user_id(email='test@example.com'):
+    return User.query.filter_by(email=email).one().id
+
 def test_health_check(client):
     response = client.get('/api/health')
     assert response.status_code == 200
@@ -218,7 +222,9 @@ def test_get_user_info(client, init_database):
     })
     assert response.status_code == 200
     assert 'user' in response.json
-    assert response.json['user']['email'] is None
+    # The stored display name answers without Microsoft Graph
+    assert response.json['user']['email'] == 'test@example.com'
+    assert response.json['user']['displayName'] == 'Test User'
 
 def test_search_items(client, init_database):
     token = create_test_token()
@@ -1448,4 +1454,915 @@ def test_user_interactions_with_system(client, init_database, monkeypatch):
     except:
         pass
 
-    os.environ['Testing'] = 'true'
\ No newline at end of file
+    os.environ['Testing'] = 'true'
+
+def test_item_similarity_model_scores_co_rated_items():
+    """Test the local item-item model ranks items liked by similar users first."""
+    from app.recommender import ItemSimilarityModel
+
+    ratings = [
+        ('a@example.com', ('movie', 1), 5), ('a@example.com', ('movie', 2), 5), ('a@example.com', ('book', 10), 1),
+        ('b@example.com', ('movie', 1), 5), ('b@example.com', ('movie', 2), 4), ('b@example.com', ('book', 10), 2),
+        ('c@example.com', ('movie', 1), 4), ('c@example.com', ('book', 10), 2),
+    ]
+    model = ItemSimilarityModel().fit(ratings)
+
+    ranked = model.score({('movie', 1): 5}, item_type='all', limit=2)
+    assert ranked[0][0] == ('movie', 2)
+    assert 0 < ranked[0][1] <= 1
+
+    # Restricting the type never returns items of the other catalog
+    ranked = model.score({('movie', 1): 5}, item_type='book', limit=5)
+    assert all(item[0] == 'book' for item, _ in ranked)
+
+def test_local_engine_recommendations(client, init_database):
+    """Test `/api/generate-recommendation?engine=local` returns catalog IDs without OpenAI."""
+    from app.recommender import invalidate_model
+
+    db.session.add(Movies(id=2, title='Second Movie', director='Someone', cast='A, B'))
+    db.session.add(Movies(id=3, title='Third Movie'))
+    other = User(display_name='Other', email='other@example.com')
+    db.session.add(other)
+    db.session.commit()
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+
+    # Another user liked the first two movies and not the third; the test user rated only the first.
+    # Mean-centered, movies 1 and 2 are similar and movie 3 is not
+    from app.models import UserMoviesWatched
+    db.session.add_all([
+        UserMoviesWatched(user_id=other.id, movie_id=1, user_rating=5),
+        UserMoviesWatched(user_id=other.id, movie_id=2, user_rating=4),
+        UserMoviesWatched(user_id=other.id, movie_id=3, user_rating=1),
+        UserMoviesWatched(user_id=get_test_user_id(), movie_id=1, user_rating=5),
+    ])
+    db.session.commit()
+    invalidate_model()
+
+    response = client.get('/api/generate-recommendation?engine=local&type=movies', headers=headers)
+    assert response.status_code == 200
+    assert response.json['status'] == 'success'
+    # Movie 2 comes from the item-item scores; movie 3 is only a popularity top-up with a lower confidence
+    assert [item['id'] for item in response.json['data']] == [2, 3]
+    assert response.json['data'][0]['type'] == 'movie'
+    assert response.json['data'][0]['confidence'] == 1.0
+    assert response.json['data'][1]['confidence'] < 0.5
+
+    response = client.get('/api/generate-recommendation?engine=unknown', headers=headers)
+    assert response.status_code == 400
+
+def test_recommendation_cache_hits_and_invalidation(client, init_database, monkeypatch):
+    """Test repeat recommendation requests are served from cache until a rating changes."""
+    from app.recommender import recommendation_cache
+    recommendation_cache.clear()
+
+    calls = []
+    def mock_llm(client, user_items, user_age, tab_type):
+        calls.append(tab_type)
+        return [{'type': 'movie', 'title': f'Suggestion {len(calls)}', 'confidence': 0.9}]
+    monkeypatch.setattr('app.routes.get_llm_client', lambda: object())
+    monkeypatch.setattr('app.routes.get_llm_recommendations', mock_llm)
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+    client.post('/api/reviews', json={'itemId': 1, 'itemType': 'movie', 'rating': 4}, headers=headers)
+
+    first = client.get('/api/generate-recommendation', headers=headers)
+    second = client.get('/api/generate-recommendation', headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert first.json['data'] == second.json['data']
+    assert len(calls) == 1
+    assert recommendation_cache.stats()['hits'] == 1
+
+    # A rating write invalidates the user's cached recommendations
+    client.put('/api/movies/1', json={'user_rating': 2}, headers=headers)
+    assert len(recommendation_cache) == 0
+    client.get('/api/generate-recommendation', headers=headers)
+    assert len(calls) == 2
+
+    assert recommendation_cache.stats()['misses'] == 2
+
+def test_recommendation_stream_parser_emits_complete_objects():
+    """Test the incremental parser yields each recommendation once its JSON object closes."""
+    from app.llm import RecommendationStreamParser
+
+    parser = RecommendationStreamParser()
+    document = '{"recommendations": [{"title": "A {tricky} \\"one\\"", "cast": ["X"]}, {"title": "B"}]}'
+
+    emitted = []
+    for index in range(0, len(document), 7):
+        emitted.extend(parser.feed(document[index:index + 7]))
+
+    assert [item['title'] for item in emitted] == ['A {tricky} "one"', 'B']
+    assert emitted[0]['cast'] == ['X']
+
+def test_stream_recommendations_sse(client, init_database, monkeypatch):
+    """Test `/api/generate-recommendation/stream` pushes one SSE event per recommendation."""
+    from app.recommender import recommendation_cache
+    recommendation_cache.clear()
+
+    class Delta:
+        def __init__(self, content):
+            self.delta = type('D', (), {'content': content})()
+
+    class Chunk:
+        def __init__(self, content):
+            self.choices = [Delta(content)]
+
+    class MockClient:
+        class chat:
+            class completions:
+                @staticmethod
+                def create(**kwargs):
+                    assert kwargs['stream'] is True
+                    body = '{"recommendations": [{"type": "movie", "title": "One"}, {"type": "book", "title": "Two"}]}'
+                    return [Chunk(body[i:i + 5]) for i in range(0, len(body), 5)]
+
+    monkeypatch.setattr('app.routes.get_openai_client', lambda **kwargs: MockClient())
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+    client.post('/api/reviews', json={'itemId': 1, 'itemType': 'movie', 'rating': 5}, headers=headers)
+
+    response = client.get('/api/generate-recommendation/stream', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    body = response.get_data(as_text=True)
+    assert body.count('event: recommendation') == 2
+    assert 'event: done' in body
+
+    # The streamed result is cached for the non-streaming endpoint as well
+    assert len(recommendation_cache) == 1
+
+def test_precompute_recommendations_batch(app, client, init_database, monkeypatch):
+    """Test the batch job stores recommendations once and the endpoint serves them."""
+    from app.batch import precompute_recommendations
+    from app.models import UserMoviesWatched, UserRecommendations
+    from app.recommender import recommendation_cache
+    recommendation_cache.clear()
+
+    calls = []
+    def mock_llm(client, user_items, user_age, tab_type):
+        calls.append(tab_type)
+        return [{'type': 'movie', 'title': f'Batch {tab_type}', 'confidence': 0.8}]
+    monkeypatch.setattr('app.batch.get_openai_client', lambda **kwargs: object())
+    monkeypatch.setattr('app.batch.get_llm_recommendations', mock_llm)
+
+    db.session.add(UserMoviesWatched(user_id=get_test_user_id(), movie_id=1, user_rating=5))
+    db.session.commit()
+
+    summary = precompute_recommendations(app, engine='llm', concurrency=1)
+    assert summary['refreshed'] == 2  # 'all' and 'movie'; no books rated yet
+    assert summary['empty'] == 1
+    assert UserRecommendations.query.count() == 2
+
+    # Unchanged history is skipped on the next run
+    summary = precompute_recommendations(app, engine='llm', concurrency=1)
+    assert summary['unchanged'] == 2
+    assert len(calls) == 2
+
+    # The interactive endpoint serves the stored list without calling the LLM
+    def fail_llm(*args, **kwargs):
+        raise AssertionError('LLM should not be called')
+    monkeypatch.setattr('app.routes.get_llm_client', lambda: object())
+    monkeypatch.setattr('app.routes.get_llm_recommendations', fail_llm)
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+    response = client.get('/api/generate-recommendation?engine=llm', headers=headers)
+    assert response.status_code == 200
+    assert response.json['data'][0]['title'] == 'Batch all'
+
+def test_signing_key_cache_ttl_and_kid_refresh(monkeypatch):
+    """Test signing keys are fetched once, and refreshed only for unknown key IDs."""
+    import threading
+    from app.auth import signing_key_cache, get_microsoft_signing_keys, verify_token_signature
+
+    fetches = []
+    def mock_fetch():
+        fetches.append(1)
+        return {'known_kid': 'key'}
+    monkeypatch.setattr(signing_key_cache, 'loader', mock_fetch)
+    monkeypatch.setattr(signing_key_cache, 'min_refresh_interval', 0)
+    signing_key_cache.clear()
+
+    # Concurrent callers share a single fetch
+    threads = [threading.Thread(target=get_microsoft_signing_keys) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert get_microsoft_signing_keys() == {'known_kid': 'key'}
+    assert len(fetches) == 1
+
+    # An unknown kid forces one refresh before the token is rejected
+    token = jwt.encode({}, key='test_key', algorithm='HS256', headers={'kid': 'rotated_kid'})
+    decoded, error = verify_token_signature(token)
+    assert decoded is None
+    assert error == "Invalid key ID in token"
+    assert len(fetches) == 2
+
+    signing_key_cache.clear()
+
+def test_get_user_profile_cached_per_token(client, init_database, monkeypatch):
+    """Test `/api/auth/user` only calls Microsoft Graph without a stored display name or on explicit refresh."""
+    calls = []
+    def mock_get_user_info(access_token):
+        calls.append(access_token)
+        return {'displayName': 'Test User', 'mail': 'test@example.com'}
+    monkeypatch.setattr('app.auth.get_user_info', mock_get_user_info)
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+
+    # The display name stored at sign-in answers a cache miss
+    for _ in range(3):
+        response = client.get('/api/auth/user', headers=headers)
+        assert response.status_code == 200
+        assert response.json['user']['email'] == 'test@example.com'
+        assert response.json['user']['displayName'] == 'Test User'
+        assert response.json['user']['isNewUser'] is False
+    assert len(calls) == 0
+
+    response = client.get('/api/auth/user?refresh=true', headers=headers)
+    assert response.status_code == 200
+    assert len(calls) == 1
+
+    # Without a stored name, a cache miss falls back to Graph
+    client.application.extensions['profile_cache'].clear()
+    db.session.get(User, get_test_user_id()).display_name = ''
+    db.session.commit()
+    response = client.get('/api/auth/user', headers=headers)
+    assert response.json['user']['displayName'] == 'Test User'
+    assert len(calls) == 2
+
+def test_middleware_caches_verified_claims(app, client, init_database, monkeypatch):
+    """Test the middleware verifies a token signature once and then serves cached claims."""
+    monkeypatch.setenv('TESTING', 'false')
+
+    verifications = []
+    def mock_verify(id_token, audience=None):
+        verifications.append(id_token)
+        return jwt.decode(id_token, options={"verify_signature": False}), None
+    monkeypatch.setattr('app.auth.verify_token_signature', mock_verify)
+
+    token = create_test_token()
+    client.set_cookie('id_token', token)
+    client.set_cookie('access_token', 'access')
+
+    for _ in range(3):
+        response = client.get('/api/auth/onboarding-status')
+        assert response.status_code == 200
+    assert len(verifications) == 1
+
+    stats = app.extensions['claims_cache'].stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+
+    # Expired tokens are rejected even though their signature verifies
+    expired = jwt.encode({'email': 'test@example.com', 'exp': datetime.utcnow() - timedelta(minutes=1)},
+                         'test-key', algorithm='HS256')
+    client.set_cookie('id_token', expired)
+    response = client.get('/api/auth/onboarding-status')
+    assert response.status_code == 401
+
+    monkeypatch.setenv('TESTING', 'true')
+
+def test_listings_keyset_pagination(client, init_database):
+    """Test `/api/listings?after=` walks the catalog by primary key without repeats."""
+    for movie_id in range(2, 8):
+        db.session.add(Movies(id=movie_id, title=f'Movie {movie_id}'))
+    db.session.commit()
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+
+    seen = []
+    cursor = ''
+    while cursor is not None:
+        response = client.get(f'/api/listings?search_global=true&type=movie&per_page=3&after={cursor}', headers=headers)
+        assert response.status_code == 200
+        seen.extend(movie['id'] for movie in response.json['data']['movies'])
+        cursor = response.json['pagination']['movies']['next_cursor']
+        assert response.json['pagination']['movies']['has_next'] == (cursor is not None)
+    assert seen == list(range(1, 8))
+
+    # Combined listings continue both sections with one cursor
+    response = client.get('/api/listings?search_global=true&per_page=1&after=', headers=headers)
+    assert response.json['data']['books'][0]['id'] == 1234567890
+    cursor = response.json['pagination']['movies']['next_cursor']
+    response = client.get(f'/api/listings?search_global=true&per_page=1&after={cursor}', headers=headers)
+    assert response.json['data']['movies'][0]['id'] == 2
+    assert response.json['data']['books'] == []
+
+    # The user's own library pages the same way
+    client.post('/api/reviews', json={'itemId': 3, 'itemType': 'movie', 'rating': 4}, headers=headers)
+    response = client.get('/api/listings?type=movie&per_page=5&after=', headers=headers)
+    assert [movie['id'] for movie in response.json['data']['movies']] == [3]
+    assert response.json['pagination']['movies']['has_next'] is False
+
+    response = client.get('/api/listings?after=not-a-cursor', headers=headers)
+    assert response.status_code == 400
+
+def test_listings_reject_cursor_for_other_ordering(client, init_database):
+    """Test a plain-listing cursor sent with a search query, or a boolean position, is a 400 and not a 500."""
+    from app.pagination import encode_cursor
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+
+    # Plain listings page by [key] alone; searches expect [relevance, key]
+    cursor = encode_cursor({'movies': [1]})
+    response = client.get(f'/api/listings?search_global=true&type=movie&query=test&after={cursor}', headers=headers)
+    assert response.status_code == 400
+    assert response.json['message'] == 'Invalid pagination cursor.'
+
+    cursor = encode_cursor({'movies': [True]})
+    response = client.get(f'/api/listings?search_global=true&type=movie&after={cursor}', headers=headers)
+    assert response.status_code == 400
+
+def test_listings_count_modes(app, client, init_database, monkeypatch):
+    """Test `count=none` skips totals and `count=estimate` serves cached totals updated by admin inserts."""
+    for movie_id in range(2, 6):
+        db.session.add(Movies(id=movie_id, title=f'Movie {movie_id}'))
+    db.session.commit()
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+
+    response = client.get('/api/listings?search_global=true&type=movie&per_page=2&count=none', headers=headers)
+    assert response.status_code == 200
+    assert response.json['pagination']['movies'] == {'current_page': 1, 'per_page': 2, 'has_next': True}
+
+    response = client.get('/api/listings?search_global=true&type=movie&per_page=2&count=estimate', headers=headers)
+    assert response.json['pagination']['movies']['total_items'] == 5
+    assert response.json['pagination']['movies']['total_is_estimate'] is True
+    assert app.extensions['count_cache'].get(('movies', '', ())) == 5
+
+    # The admin insert path bumps the cached total instead of forcing a recount
+    monkeypatch.setenv('TESTING', 'false')
+    monkeypatch.setattr('app.middleware.get_verified_claims', lambda id_token: ({'email': 'admin@example.com', 'roles': ['admin']}, None))
+    client.set_cookie('id_token', 'admin')
+    client.set_cookie('access_token', 'admin')
+    response = client.post('/api/movies', json={
+        'id': 99, 'title': 'New', 'director': 'D', 'cast': 'C', 'release_date': '2020-01-01',
+        'original_language': 'en', 'genres': 'Drama'
+    })
+    assert response.status_code == 201
+    assert app.extensions['count_cache'].get(('movies', '', ())) == 6
+
+    response = client.get('/api/listings?search_global=true&type=movie&per_page=2&count=bogus')
+    assert response.status_code == 400
+
+    monkeypatch.setenv('TESTING', 'true')
+
+def test_suggest_prefix_matches(app, client, init_database):
+    """Test `/api/suggest` returns normalized prefix matches and sees newly added titles."""
+    db.session.add(Movies(id=2, title='Amélie'))
+    db.session.add(Movies(id=3, title='The Matrix'))
+    db.session.add(Books(isbn=42, book_title='Test Pilot', book_author='Someone'))
+    db.session.commit()
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+
+    response = client.get('/api/suggest?q=te', headers=headers)
+    assert response.status_code == 200
+    assert [(item['type'], item['title']) for item in response.json['data']] == [
+        ('book', 'Test Book'), ('movie', 'Test Movie'), ('book', 'Test Pilot')]
+
+    response = client.get('/api/suggest?q=AME&type=movie', headers=headers)
+    assert [item['id'] for item in response.json['data']] == [2]
+
+    app.extensions['title_index'].add('movie', 4, 'Test Pattern')
+    response = client.get('/api/suggest?q=test p&limit=5', headers=headers)
+    assert [item['title'] for item in response.json['data']] == ['Test Pattern', 'Test Pilot']
+
+    response = client.get('/api/suggest?q=te&limit=0', headers=headers)
+    assert response.status_code == 400
+
+def test_title_index_keeps_titles_added_during_a_rebuild(app, init_database, monkeypatch):
+    """Test a title added while a rebuild loads its snapshot survives the swap, and re-adding an id replaces it."""
+    from app import suggest
+
+    index = suggest.TitleIndex()
+    normalize_title = suggest.normalize_title
+    added = []
+    def normalize_and_add_once(title):
+        # An admin adds a movie after the rebuild has read the movies table
+        if not added:
+            added.append(5)
+            index.add('movie', 5, 'Late Addition')
+        return normalize_title(title)
+    monkeypatch.setattr(suggest, 'normalize_title', normalize_and_add_once)
+
+    with app.app_context():
+        index.build()
+    monkeypatch.setattr(suggest, 'normalize_title', normalize_title)
+    assert [item['id'] for item in index.search('late')] == [5]
+
+    index.add('movie', 5, 'Renamed Addition')
+    assert index.search('late') == []
+    assert [item['title'] for item in index.search('renamed')] == ['Renamed Addition']
+
+def test_title_index_startup_build_shares_first_request_lock(monkeypatch):
+    """Test the startup warm-up and the first suggest request build the title index only once."""
+    import time
+    from app.config import TestingConfig
+    from app.suggest import TitleIndex
+
+    builds = []
+    started, release = threading.Event(), threading.Event()
+    def blocking_build(index):
+        builds.append(threading.current_thread().name)
+        started.set()
+        release.wait(5)
+        index._built_at = time.time()
+    monkeypatch.setattr(TitleIndex, 'build', blocking_build)
+    monkeypatch.setattr(TestingConfig, 'SUGGEST_BUILD_ON_STARTUP', True)
+    monkeypatch.setenv('TESTING', 'true')
+
+    app = create_app('testing')
+    assert started.wait(5)
+    # A first request arriving while the warm-up builds waits for it instead of building again
+    request = threading.Thread(target=app.extensions['title_index'].ensure_fresh, args=(app,), name='first-request')
+    request.start()
+    time.sleep(0.1)
+    release.set()
+    request.join(5)
+    assert builds == ['title-index-warmup']
+
+def test_run_sections_runs_concurrently(monkeypatch):
+    """Test listing sections run side by side, each in its own application context."""
+    from app.config import TestingConfig
+    from app.pagination import run_sections
+
+    monkeypatch.setattr(TestingConfig, 'LISTING_QUERY_WORKERS', 2)
+    monkeypatch.setenv('TESTING', 'true')
+    app = create_app('testing')
+    assert app.extensions['listing_executor'] is not None
+
+    # Both sections must be in flight at the same time to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def section(name):
+        barrier.wait()
+        return name, id(db.session())
+
+    with app.app_context():
+        results = run_sections({'movies': lambda: section('movies'), 'books': lambda: section('books')})
+
+    assert list(results) == ['movies', 'books']
+    assert results['movies'][0] == 'movies' and results['books'][0] == 'books'
+    # Each section used its own session, so its own pooled connection
+    assert results['movies'][1] != results['books'][1]
+
+def test_listing_rows_match_entity_shape(client, init_database):
+    """Test projected listing rows serialize exactly like the ORM entities they replace."""
+    from app.models import UserMoviesWatched, UserBooksRead
+    from app.rows import MovieRow, BookRow, UserBookRow
+
+    db.session.add(UserMoviesWatched(user_id=get_test_user_id(), movie_id=1, user_rating=4))
+    db.session.add(UserBooksRead(user_id=get_test_user_id(), isbn=1234567890, user_rating=5))
+    db.session.commit()
+
+    movie = db.session.get(Movies, 1)
+    book = db.session.get(Books, 1234567890)
+    assert MovieRow(MovieRow.query().one()).to_dict() == movie.to_dict()
+    assert BookRow(BookRow.query().one()).to_dict() == {**book.to_dict(), 'id': 1234567890}
+    assert UserBookRow(UserBookRow.query().one()).to_dict()['user_rating'] == 5
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+    response = client.get('/api/listings?search_global=false', headers=headers)
+    assert response.status_code == 200
+    assert response.json['data']['movies'] == [{**movie.to_dict(), 'user_rating': 4}]
+    assert response.json['data']['books'] == [{**book.to_dict(), 'id': 1234567890, 'user_rating': 5}]
+
+def test_fast_json_provider(app):
+    """Test the JSON provider matches Flask's output and builds responses from bytes."""
+    from flask.json.provider import DefaultJSONProvider
+    from app.json_provider import FastJSONProvider
+
+    assert isinstance(app.json, FastJSONProvider)
+
+    payload = {'b': 1, 'a': {'release_date': datetime(2020, 1, 1).date(), 'title': 'Amélie'}}
+    assert json.loads(app.json.dumps(payload)) == json.loads(DefaultJSONProvider(app).dumps(payload))
+
+    with app.app_context():
+        response = app.json.response({'data': [{'id': 1}, [2, 3]]})
+        assert response.mimetype == 'application/json'
+        assert json.loads(response.get_data()) == {'data': [{'id': 1}, [2, 3]]}
+        assert json.loads(app.json.response(1, 2).get_data()) == [1, 2]
+        assert app.json.response().get_data() == b'null\n'
+        with pytest.raises(TypeError):
+            app.json.response(1, a=2)
+
+    app.json.date_format = 'iso'
+    assert json.loads(app.json.dumps({'d': datetime(2020, 1, 1).date()})) == {'d': '2020-01-01'}
+
+def test_listings_etag_conditional_get(app, client, init_database, monkeypatch):
+    """Test listings return 304 for a current ETag and a new ETag after catalog or rating writes."""
+    from app.versions import CATALOG_SCOPE, bump_versions, user_scope
+
+    url = '/api/listings?search_global=true&type=movie&per_page=5'
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    # A matching If-None-Match short-circuits before the listing queries run
+    def fail_listing(*args, **kwargs):
+        raise AssertionError('listing queried despite matching ETag')
+
+    with monkeypatch.context() as patched:
+        patched.setattr('app.routes.get_global_list', fail_listing)
+        response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+
+    # Different parameters and rating writes do not touch this page's ETag, catalog writes do
+    assert client.get(url + '&page=2').headers['ETag'] != etag
+    bump_versions(user_scope('test@example.com'))
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    bump_versions(CATALOG_SCOPE)
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+
+    # Library pages change with the user's own ratings
+    library = '/api/listings?type=movie&per_page=5'
+    etag = client.get(library).headers['ETag']
+    response = client.post('/api/reviews', json={'itemId': 1, 'itemType': 'movie', 'rating': 4})
+    assert response.status_code == 200
+    assert client.get(library, headers={'If-None-Match': etag}).status_code == 200
+
+def test_batch_reviews(client, init_database):
+    """Test `/api/reviews/batch` inserts valid ratings together and reports every entry."""
+    from app.models import UserMoviesWatched, UserBooksRead
+
+    db.session.add(Movies(id=2, title='Second Movie'))
+    db.session.add(UserMoviesWatched(user_id=get_test_user_id(), movie_id=2, user_rating=3))
+    db.session.commit()
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+    response = client.post('/api/reviews/batch', headers=headers, json={'reviews': [
+        {'itemId': 1, 'itemType': 'movie', 'rating': 5},
+        {'itemId': 1234567890, 'itemType': 'book', 'rating': 4},
+        {'itemId': 2, 'itemType': 'movie', 'rating': 4},
+        {'itemId': 999, 'itemType': 'movie', 'rating': 4},
+        {'itemId': 1, 'itemType': 'movie', 'rating': 1},
+        {'itemId': 1, 'itemType': 'show', 'rating': 4},
+        {'itemId': 1, 'itemType': 'book', 'rating': 9},
+    ]})
+    assert response.status_code == 200
+    assert response.json['data']['added'] == 2
+    assert [result['status'] for result in response.json['data']['results']] == [
+        'added', 'added', 'duplicate', 'not_found', 'duplicate', 'invalid', 'invalid']
+
+    assert UserMoviesWatched.query.filter_by(user_id=get_test_user_id(), movie_id=1).one().user_rating == 5
+    assert UserBooksRead.query.filter_by(user_id=get_test_user_id()).one().user_rating == 4
+
+    assert client.post('/api/reviews/batch', headers=headers, json={'reviews': []}).status_code == 400
+
+def test_batch_reviews_reports_ratings_written_concurrently(client, init_database, monkeypatch):
+    """Test a rating written between the batch lookup and its insert is reported as a duplicate, not added."""
+    import app.routes
+    from app.bulk import upsert_rows
+    from app.models import UserMoviesWatched
+
+    db.session.add(Movies(id=3, title='Third Movie'))
+    db.session.commit()
+
+    def upsert_after_concurrent_write(model, rows, **kwargs):
+        # Another request rates movie 3 just before every insert of this batch
+        upsert_rows(model, [{'user_id': get_test_user_id(), 'movie_id': 3, 'user_rating': 2}],
+                    update_columns=[], conflict_columns=['user_id', 'movie_id'])
+        return upsert_rows(model, rows, **kwargs)
+    monkeypatch.setattr(app.routes, 'upsert_rows', upsert_after_concurrent_write)
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+    response = client.post('/api/reviews/batch', headers=headers, json={'reviews': [
+        {'itemId': 1, 'itemType': 'movie', 'rating': 5},
+        {'itemId': 3, 'itemType': 'movie', 'rating': 4},
+    ]})
+    assert response.status_code == 200
+    assert response.json['data']['added'] == 1
+    assert [result['status'] for result in response.json['data']['results']] == ['added', 'duplicate']
+    assert UserMoviesWatched.query.filter_by(user_id=get_test_user_id(), movie_id=3).one().user_rating == 2
+    assert db.session.get(User, get_test_user_id()).movies_rated == 1
+
+def test_import_catalog_streams_chunked_upserts(app, client, init_database, monkeypatch):
+    """Test the catalog import upserts in chunks, reports rejects and serves uploads."""
+    import io
+    from app.catalog_import import import_catalog
+
+    upload = (
+        "id,title,release_date,original_language,genres,cast,director,poster_path\n"
+        "1,Test Movie Renamed,2001-02-03,en,Drama,A,D,\n"
+        "2,Second,2002-01-01,fr,Comedy,B,E,/p.jpg\n"
+        "3,Bad Date,yesterday,en,Drama,C,F,\n"
+        "4,,2002-01-01,en,Drama,C,F,\n"
+        "5,Fifth,2005-05-05,en,Drama,C,F,\n"
+    )
+    progress = []
+    summary = import_catalog('movies', io.StringIO(upload), 'csv', chunk_size=2, on_progress=progress.append)
+
+    assert summary['processed'] == 5 and summary['upserted'] == 3 and summary['rejected'] == 2
+    assert [reject['line'] for reject in summary['rejects']] == [4, 5]
+    assert len(progress) == 3
+    assert db.session.get(Movies, 1).title == 'Test Movie Renamed'
+    assert Movies.query.count() == 3
+
+    # The admin endpoint streams a raw JSONL body through the same importer
+    monkeypatch.setattr('app.middleware.validate_tokens',
+                        lambda: ({'email': 'admin@example.com', 'roles': ['admin']}, None))
+    body = '{"isbn": "42", "book_title": "New", "book_author": "A", "year_of_publication": 1999}\n' \
+           '{"isbn": "97A", "book_title": "Bad", "book_author": "A", "year_of_publication": 1999}\n'
+    response = client.post('/api/admin/import/books?format=jsonl', data=body.encode('utf-8'),
+                           content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert response.json['data']['upserted'] == 1 and response.json['data']['rejected'] == 1
+    assert db.session.get(Books, 42).book_title == 'New'
+
+def test_ingest_dataset_resumes_from_checkpoint(app, init_database, tmp_path, monkeypatch):
+    """Test dataset ingestion cleans raw Book-Crossing rows and resumes after a failed chunk."""
+    from app import catalog_import
+    from app.ingest import ingest_dataset
+
+    source = tmp_path / 'Books.csv'
+    source.write_text(
+        "ISBN,Book-Title,Book-Author,Year-Of-Publication,Image-URL-S\n"
+        "11,\"First, with comma\",A,1999,\n"
+        "12,Second,B,2001,http://img/12.jpg\n"
+        "X13,Bad ISBN,C,2001,\n"
+        "14,Bad Year,D,19999,\n"
+        "15,Fifth,E,2005,\n"
+        "16,Sixth,F,2006,\n",
+        encoding='utf-8'
+    )
+    checkpoint_path = str(tmp_path / 'books.checkpoint.json')
+
+    # Fail the third chunk to simulate a crash part-way through the load
+    upsert_rows = catalog_import.upsert_rows
+    calls = []
+    def flaky_upsert(model, rows):
+        calls.append([row['isbn'] for row in rows])
+        if len(calls) == 3:
+            raise RuntimeError('connection lost')
+        upsert_rows(model, rows)
+    monkeypatch.setattr(catalog_import, 'upsert_rows', flaky_upsert)
+
+    with pytest.raises(RuntimeError):
+        ingest_dataset('books', str(source), checkpoint_path, chunk_size=2)
+    assert Books.query.filter(Books.isbn.in_([11, 12, 15, 16])).count() == 2
+
+    checkpoint = ingest_dataset('books', str(source), checkpoint_path, chunk_size=2)
+    # Only the failed chunk is replayed
+    assert calls == [[11, 12], [], [15, 16], [15, 16]]
+    assert checkpoint['done'] and checkpoint['processed'] == 6
+    assert checkpoint['upserted'] == 4 and checkpoint['rejected'] == 2
+    assert db.session.get(Books, 11).book_title == 'First, with comma'
+    assert db.session.get(Books, 16).book_author == 'F'
+
+def test_sync_movies_applies_only_changes(app, init_database, monkeypatch):
+    """Test the TMDB delta sync inserts, updates and deletes only what changed."""
+    import io
+    from app import tmdb_sync
+    from app.catalog_import import import_catalog
+    from app.models import UserMoviesWatched
+
+    header = "id,title,release_date,original_language,genres,cast,director,poster_path,popularity\n"
+    rows = {movie_id: f"{movie_id},Movie {movie_id},2000-01-0{movie_id},en,Drama,A,D,,1.5\n" for movie_id in range(1, 6)}
+    import_catalog('movies', io.StringIO(header + ''.join(rows.values())))
+    db.session.add(UserMoviesWatched(user_id=get_test_user_id(), movie_id=5, user_rating=4))
+    db.session.commit()
+
+    written = []
+    upsert_rows = tmdb_sync.upsert_rows
+    def recording_upsert(model, batch):
+        written.extend(row['id'] for row in batch)
+        upsert_rows(model, batch)
+    monkeypatch.setattr(tmdb_sync, 'upsert_rows', recording_upsert)
+
+    # Movie 2 changes, 4 and 5 disappear (5 is rated so it stays), 6 is new
+    rows[2] = "2,Movie 2 (Director's Cut),2000-01-02,en,Drama,A,D,,9.9\n"
+    del rows[4], rows[5]
+    rows[6] = "6,Movie 6,2006-06-06,en,Drama,A,D,,1.0\n"
+    # The dump repeats movie 6, which must be written and counted once
+    dump = header + ''.join(rows.values()) + rows[6]
+    summary = tmdb_sync.sync_movies(io.StringIO(dump), max_delete_fraction=0.5)
+
+    assert summary == {'inserted': 1, 'updated': 1, 'unchanged': 2, 'deleted': 1, 'retained': 1, 'rejected': 0}
+    assert sorted(written) == [2, 6]
+    assert db.session.get(Movies, 2).title == "Movie 2 (Director's Cut)"
+    assert db.session.get(Movies, 4) is None and db.session.get(Movies, 5) is not None
+
+    # A second run over the same dump writes nothing
+    written.clear()
+    summary = tmdb_sync.sync_movies(io.StringIO(header + ''.join(rows.values())))
+    assert written == [] and summary['unchanged'] == 4
+
+def test_listings_catalog_filters_and_facets(client, init_database):
+    """Test genre/cast/language/year filters use the normalized tables and facets are counted."""
+    import io
+    from app.catalog_import import import_catalog
+    from app.models import MovieGenre
+
+    import_catalog('movies', io.StringIO(
+        "id,title,release_date,original_language,genres,cast,director\n"
+        "1,Test Movie,1999-05-01,en,\"Action, Drama\",\"Ann, Bob\",D\n"
+        "2,Second,2005-01-01,fr,Drama,Bob,D\n"
+        "3,Third,2010-01-01,en,Comedy,Cat,D\n"
+    ))
+    assert sorted(genre for (genre,) in db.session.query(MovieGenre.genre).filter_by(movie_id=1)) == ['Action', 'Drama']
+
+    def movie_ids(query):
+        response = client.get(f'/api/listings?search_global=true&per_page=10&{query}')
+        assert response.status_code == 200
+        return [movie['id'] for movie in response.json['data']['movies']], response.json
+
+    assert movie_ids('type=movie&genre=Drama')[0] == [1, 2]
+    assert movie_ids('type=movie&genre=Drama&genre=Action')[0] == [1]
+    assert movie_ids('type=movie&cast=Bob&language=fr')[0] == [2]
+    assert movie_ids('type=movie&year_from=2000&year_to=2009')[0] == [2]
+
+    # Movie-only filters leave no books; year filters apply to books too
+    ids, body = movie_ids('genre=Drama&facets=true')
+    assert body['data']['books'] == [] and body['pagination']['books']['total_items'] == 0
+    assert body['facets']['genres'] == [{'value': 'Drama', 'count': 2}, {'value': 'Action', 'count': 1}]
+    assert body['facets']['languages'] == [{'value': 'en', 'count': 1}, {'value': 'fr', 'count': 1}]
+    assert movie_ids('year_from=2021')[1]['data']['books'] == []
+    assert len(movie_ids('year_to=2020')[1]['data']['books']) == 1
+
+    assert client.get('/api/listings?search_global=true&year_from=soon').status_code == 400
+
+def test_ratings_reference_user_id(app, client, init_database):
+    """Test rating rows are keyed by rc_user.id and the id is resolved once per request."""
+    from app.models import UserMoviesWatched
+    from app.middleware import get_user_id
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+    response = client.post('/api/reviews', headers=headers, json={'itemId': 1, 'itemType': 'movie', 'rating': 4})
+    assert response.status_code == 200
+    assert UserMoviesWatched.query.one().user_id == get_test_user_id()
+
+    response = client.get('/api/listings?type=movie', headers=headers)
+    assert [movie['user_rating'] for movie in response.json['data']['movies']] == [4]
+
+    # Within a request the lookup is remembered, so a second call does not query again
+    user_id = get_test_user_id()
+    with app.test_request_context():
+        assert get_user_id('test@example.com') == user_id
+        User.query.filter_by(email='test@example.com').delete()
+        assert get_user_id('test@example.com') == user_id
+    assert get_user_id('test@example.com') is None
+    db.session.rollback()
+
+def test_upsert_review(client, init_database):
+    """Test `PUT /api/reviews` adds a rating, then replaces it in place."""
+    from app.models import UserMoviesWatched
+
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+    for rating in (2, 5):
+        response = client.put('/api/reviews', headers=headers, json={'itemId': 1, 'itemType': 'movie', 'rating': rating})
+        assert response.status_code == 200
+        assert response.json['data']['user_rating'] == rating
+    assert [row.user_rating for row in UserMoviesWatched.query.all()] == [5]
+
+    response = client.get('/api/listings?type=movie', headers=headers)
+    assert response.json['data']['movies'][0]['user_rating'] == 5
+
+    response = client.put('/api/reviews', headers=headers, json={'itemId': 1, 'itemType': 'movie', 'rating': 9})
+    assert response.status_code == 400
+
+def test_rating_counts_follow_rating_writes(client, init_database):
+    """Test every rating write keeps the rc_user counters that onboarding status reads."""
+    from app.models import UserBooksRead
+    from app.ratings import reconcile_rating_counts
+
+    db.session.add_all([Movies(id=2, title='Second Movie'), Movies(id=3, title='Third Movie')])
+    db.session.commit()
+    token = create_test_token()
+    headers = {'Cookie': f'id_token={token}; access_token={token}'}
+
+    def progress():
+        return client.get('/api/auth/onboarding-status', headers=headers).json['progress']
+
+    client.post('/api/reviews', headers=headers, json={'itemId': 1, 'itemType': 'movie', 'rating': 4})
+    client.post('/api/reviews', headers=headers, json={'itemId': 1, 'itemType': 'movie', 'rating': 4})
+    client.put('/api/reviews', headers=headers, json={'itemId': 2, 'itemType': 'movie', 'rating': 3})
+    client.put('/api/reviews', headers=headers, json={'itemId': 2, 'itemType': 'movie', 'rating': 5})
+    client.post('/api/reviews/batch', headers=headers, json={'reviews': [
+        {'itemId': 3, 'itemType': 'movie', 'rating': 2},
+        {'itemId': 1234567890, 'itemType': 'book', 'rating': 4},
+    ]})
+    assert progress()['movies'] == 3 and progress()['books'] == 1
+
+    client.delete('/api/movies/3', headers=headers)
+    client.delete('/api/movies/3', headers=headers)
+    assert progress()['movies'] == 2
+
+    # Drift from writes outside the API is repaired by the reconciliation command
+    UserBooksRead.query.delete()
+    db.session.commit()
+    assert reconcile_rating_counts() == {'movie': 0, 'book': 1}
+    assert progress()['books'] == 0
+
+def test_metered_pool_reports_checkout_waits(client, init_database, monkeypatch):
+    """Test the metered pool counts checkouts, in-use connections and timeouts."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+    from app.db_pool import MeteredQueuePool, pool_stats
+
+    engine = create_engine('sqlite://', poolclass=MeteredQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05)
+    connection = engine.connect()
+    stats = pool_stats(engine)
+    assert stats['in_use'] == 1 and stats['overflow'] == 0 and stats['checkouts'] == 1
+
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    stats = pool_stats(engine)
+    assert stats['timeouts'] == 1 and stats['max_wait_ms'] >= 50
+    connection.close()
+    assert pool_stats(engine)['in_use'] == 0
+
+    monkeypatch.setattr('app.middleware.validate_tokens', lambda: ({'email': 'admin@example.com', 'roles': ['admin']}, None))
+    response = client.get('/api/admin/stats')
+    assert response.json['data']['db_pool']['pool'] == 'StaticPool'
+
+def test_read_replica_routing(monkeypatch):
+    """Test read-only views read from a healthy replica, except right after the user's own rating write."""
+    from app.config import TestingConfig
+    from app.replicas import PIN_COOKIE
+
+    monkeypatch.setattr(TestingConfig, 'DATABASE_REPLICA_URLS', ['sqlite://'])
+    monkeypatch.setenv('TESTING', 'true')
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        replica = db.engines['replica_0']
+        db.metadata.create_all(replica)
+        with replica.begin() as connection:
+            connection.execute(Movies.__table__.insert(), {'id': 1, 'title': 'Replica Movie'})
+        db.session.add_all([User(display_name='Test User', email='test@example.com'),
+                            Movies(id=1, title='Primary Movie')])
+        db.session.commit()
+        client = app.test_client()
+
+        def listed_title():
+            response = client.get('/api/listings?search_global=true&type=movie')
+            return response.json['data']['movies'][0]['title']
+
+        assert listed_title() == 'Replica Movie'
+
+        response = client.post('/api/reviews', json={'itemId': 1, 'itemType': 'movie', 'rating': 4})
+        assert PIN_COOKIE in response.headers['Set-Cookie']
+        assert listed_title() == 'Primary Movie'
+
+        # An unreachable replica is skipped until a later health check finds it again
+        client.delete_cookie(PIN_COOKIE)
+        router = app.extensions['replica_router']
+        router.check_interval = 0
+        def unreachable():
+            raise RuntimeError('replica is down')
+        with monkeypatch.context() as patch:
+            patch.setattr(replica, 'connect', unreachable)
+            assert listed_title() == 'Primary Movie'
+        assert router.stats(db.engines)['replicas']['replica_0']['healthy'] is False
+        assert router.stats(db.engines)['fallbacks'] == 1
+
+        db.session.remove()
+        db.drop_all()
+    # create_app registered the replica bind's metadata on the shared db; later apps have no such engine
+    db.metadatas.pop('replica_0', None)
+
+def test_middleware_rejects_tokens_without_kid_or_for_other_apps(app, client, init_database, monkeypatch):
+    """Test the middleware answers 401, not 500, for tokens without a kid or issued to another client ID."""
+    monkeypatch.setenv('TESTING', 'false')
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption()
+    ).decode()
+    monkeypatch.setattr('app.auth.get_microsoft_signing_keys', lambda: {'kid-1': private_key.public_key()})
+
+    def status(token):
+        client.set_cookie('id_token', token)
+        client.set_cookie('access_token', 'access')
+        return client.get('/api/auth/onboarding-status').status_code
+
+    assert status(create_test_token()) == 401
+    exp = datetime.utcnow() + timedelta(hours=1)
+    other_app = jwt.encode({'email': 'test@example.com', 'aud': 'other-client-id', 'exp': exp},
+                           private_pem, algorithm='RS256', headers={'kid': 'kid-1'})
+    assert status(other_app) == 401
+    ours = jwt.encode({'email': 'test@example.com', 'aud': app.config['MICROSOFT_CLIENT_ID'], 'exp': exp},
+                      private_pem, algorithm='RS256', headers={'kid': 'kid-1'})
+    assert status(ours) == 200
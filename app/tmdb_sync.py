@@ -0,0 +1,131 @@
+import io
+import json
+import logging
+import time
+
+import click
+from sqlalchemy import exists
+
+from app.bulk import chunked, upsert_rows
+from app.catalog_import import clean_movie, iter_records, refresh_catalog_caches
+from app.extensions import db
+from app.facets import replace_movie_facets
+from app.models import Movies, UserMoviesWatched
+
+# Abort deletions when a dump would remove more than this share of the catalog (likely a truncated file)
+MAX_DELETE_FRACTION = 0.1
+
+
+def load_stored_hashes():
+    """Stream the stored content hash of every movie into an id -> hash dictionary."""
+    return dict(db.session.query(Movies.id, Movies.content_hash).yield_per(50000))
+
+
+def sync_movies(stream, batch_size=1000, allow_deletes=True, max_delete_fraction=MAX_DELETE_FRACTION,
+                on_progress=None):
+    """
+    Apply a full TMDB dump to the movies table, writing only what changed.
+
+    The stored hashes are loaded into an id -> hash index. Every dump row is
+    hashed and looked up: unknown ids are inserted, different hashes are
+    updated and matching ones are skipped. Ids left in the index after the dump
+    are deleted. Inserts and updates are written in batches of multi-row upserts
+    and deletes in batches of ids. Movies that users have rated are kept even if
+    the dump dropped them. Must run inside an application context.
+
+    Args:
+    - stream: Text stream or iterable of lines of the TMDB CSV dump
+    - batch_size: Rows per upsert or delete statement
+    - allow_deletes: Whether to delete movies missing from the dump
+    - max_delete_fraction: Skip deletions when more than this share of the catalog is missing
+    - on_progress: Optional callable receiving the running summary after every batch
+
+    Returns:
+    - Summary dictionary with inserted, updated, unchanged, deleted, retained and rejected counts
+    """
+    started = time.time()
+    stored = load_stored_hashes()
+    catalog_size = len(stored)
+    summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'retained': 0, 'rejected': 0}
+
+    def flush(rows):
+        upsert_rows(Movies, rows)
+        replace_movie_facets(rows)
+        db.session.commit()
+        if on_progress:
+            on_progress(summary)
+
+    pending = []
+    seen = set()
+    for line_number, record in iter_records(stream, 'csv'):
+        try:
+            row = clean_movie(record)
+        except (ValueError, TypeError) as e:
+            summary['rejected'] += 1
+            logging.warning(f"Skipping TMDB dump line {line_number}: {str(e)}")
+            # A row we cannot read must not make its movie look deleted
+            try:
+                stored.pop(int(record['id']), None)
+            except (KeyError, TypeError, ValueError):
+                pass
+            continue
+
+        # A movie listed twice is applied and counted once; a second copy in a batch would break the upsert
+        if row['id'] in seen:
+            logging.warning(f"Skipping TMDB dump line {line_number}: movie {row['id']} already appeared")
+            continue
+        seen.add(row['id'])
+
+        stored_hash = stored.pop(row['id'], None) if row['id'] in stored else False
+        if stored_hash == row['content_hash']:
+            summary['unchanged'] += 1
+            continue
+        summary['inserted' if stored_hash is False else 'updated'] += 1
+        pending.append(row)
+        if len(pending) >= batch_size:
+            flush(pending)
+            pending = []
+    if pending:
+        flush(pending)
+
+    missing = list(stored)
+    if missing and allow_deletes:
+        if catalog_size and len(missing) > catalog_size * max_delete_fraction:
+            logging.error("TMDB dump is missing %s of %s movies; skipping deletions", len(missing), catalog_size)
+            summary['retained'] += len(missing)
+        else:
+            for batch in chunked(missing, batch_size):
+                deleted = Movies.query.filter(
+                    Movies.id.in_(batch),
+                    ~exists().where(UserMoviesWatched.movie_id == Movies.id)
+                ).delete(synchronize_session=False)
+                db.session.commit()
+                summary['deleted'] += deleted
+                summary['retained'] += len(batch) - deleted
+                if on_progress:
+                    on_progress(summary)
+    elif missing:
+        summary['retained'] += len(missing)
+
+    if summary['inserted'] or summary['updated'] or summary['deleted']:
+        refresh_catalog_caches('movies')
+
+    logging.info("Synced TMDB dump in %.1f s: %s", time.time() - started, summary)
+    return summary
+
+
+def register_commands(app):
+    """Register the TMDB delta sync as a Flask CLI command."""
+
+    @app.cli.command('sync-movies')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--batch-size', default=1000, show_default=True, help='Rows per upsert or delete statement.')
+    @click.option('--no-delete', is_flag=True, help='Keep movies that are missing from the dump.')
+    def sync_movies_command(path, batch_size, no_delete):
+        """Apply only the inserts, updates and deletes between a TMDB dump and the movies table."""
+        def progress(summary):
+            click.echo(', '.join(f'{count} {name}' for name, count in summary.items()), err=True)
+
+        with io.open(path, encoding='utf-8-sig', newline='') as stream:
+            summary = sync_movies(stream, batch_size, allow_deletes=not no_delete, on_progress=progress)
+        click.echo(json.dumps(summary))
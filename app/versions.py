@@ -0,0 +1,60 @@
+import hashlib
+import logging
+
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import CacheVersion
+
+# Scope of the movie and book catalog, bumped by admin inserts
+CATALOG_SCOPE = 'catalog'
+
+
+def user_scope(user_email):
+    """Scope of a user's library, bumped by their rating writes."""
+    return f'user:{user_email}'
+
+
+def get_versions(*scopes):
+    """
+    Read the current version of each scope with a single primary-key lookup.
+
+    Returns:
+    - Dictionary mapping each scope to its version, 0 for scopes never bumped
+    """
+    rows = db.session.query(CacheVersion.scope, CacheVersion.version)\
+        .filter(CacheVersion.scope.in_(scopes)).all()
+    versions = dict.fromkeys(scopes, 0)
+    versions.update(rows)
+    return versions
+
+
+def bump_versions(*scopes):
+    """
+    Increment the version of each scope and commit.
+
+    Call after the change itself has been committed, so a client can never
+    see the new version together with the old data.
+    """
+    for scope in scopes:
+        try:
+            updated = CacheVersion.query.filter_by(scope=scope)\
+                .update({CacheVersion.version: CacheVersion.version + 1})
+            if not updated:
+                db.session.add(CacheVersion(scope=scope, version=1))
+            db.session.commit()
+        except IntegrityError:
+            # Another request created the row first; increment that one instead
+            db.session.rollback()
+            CacheVersion.query.filter_by(scope=scope)\
+                .update({CacheVersion.version: CacheVersion.version + 1})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error bumping cache version {scope}: {str(e)}")
+
+
+def compute_etag(versions, *parts):
+    """Strong ETag value for a response derived from the given versions and request parts."""
+    raw = repr((sorted(versions.items()), parts)).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()
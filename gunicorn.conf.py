@@ -0,0 +1,33 @@
+# Gunicorn settings for the production server (python start.py --production)
+import multiprocessing
+import os
+
+wsgi_app = 'app:create_app()'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Cooperative gevent workers: the OAuth, Graph and OpenAI routes mostly wait on the network,
+# so each worker process serves many of them at once instead of one request per process
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# One cooperative worker per CPU, or the usual 2 x CPUs + 1 for blocking workers. Every worker has
+# its own connection pool, so workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) must fit MySQL's max_connections
+cpus = multiprocessing.cpu_count()
+workers = int(os.getenv('WEB_CONCURRENCY', cpus if worker_class == 'gevent' else cpus * 2 + 1))
+
+# Seconds a worker may go without notifying the arbiter before it is killed and replaced. Blocking workers
+# notify between requests, so for them this caps a request; gevent workers notify from their own greenlet
+# while requests run, so it only catches a stuck worker. With gevent a request is bounded by OPENAI_TIMEOUT
+# (with OPENAI_MAX_RETRIES) for OpenAI calls and DB_POOL_TIMEOUT for waiting on a database connection
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+# On SIGHUP (graceful reload) or SIGTERM, old workers finish in-flight requests for up to this long
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Replace workers after a number of requests, staggered so they do not all restart together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
@@ -0,0 +1,74 @@
+"""
+Microbenchmark: encode throughput of a 100-item listing page per JSON provider.
+
+Run with:
+    python -m scripts.bench_json [--items 100] [--rounds 2000]
+"""
+import argparse
+import time
+from datetime import date
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.json_provider import FastJSONProvider
+
+
+def listing_page(items):
+    """Build a /api/listings-shaped payload with items movies and items books."""
+    movies = [{
+        'id': movie_id,
+        'title': f'Movie title number {movie_id}',
+        'release_date': date(1990 + movie_id % 30, movie_id % 12 + 1, movie_id % 28 + 1),
+        'original_language': 'en',
+        'genres': 'Action, Adventure, Science Fiction',
+        'cast': 'First Actor, Second Actor, Third Actor, Fourth Actor, Fifth Actor',
+        'director': 'Some Director',
+        'poster_path': f'/poster{movie_id}.jpg',
+        'type': 'movie'
+    } for movie_id in range(items)]
+    books = [{
+        'id': 9780000000000 + isbn,
+        'isbn': 9780000000000 + isbn,
+        'book_title': f'Book title number {isbn}',
+        'book_author': 'Some Author',
+        'year_of_publication': 1990 + isbn % 30,
+        'image_url_s': f'http://images.example.com/{isbn}.jpg',
+        'type': 'book'
+    } for isbn in range(items)]
+    return {
+        'status': 'success',
+        'data': {'movies': movies, 'books': books},
+        'pagination': {'movies': {'current_page': 1, 'per_page': items, 'has_next': True}}
+    }
+
+
+def measure(label, encode, rounds):
+    encode()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        size = len(encode())
+    elapsed = time.perf_counter() - started
+    print(f'{label:<28} {rounds / elapsed:>10.0f} pages/s  {elapsed / rounds * 1e6:>8.1f} us/page  {size} bytes')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=100, help='Items per section on the page.')
+    parser.add_argument('--rounds', type=int, default=2000, help='Pages encoded per provider.')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    page = listing_page(args.items)
+    default = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+    iso = FastJSONProvider(app)
+    iso.date_format = 'iso'
+
+    measure('flask default', lambda: default.dumps(page, separators=(',', ':')), args.rounds)
+    measure('fast (http dates)', lambda: fast.dumps_bytes(page), args.rounds)
+    measure('fast (iso dates)', lambda: iso.dumps_bytes(page), args.rounds)
+
+
+if __name__ == '__main__':
+    main()
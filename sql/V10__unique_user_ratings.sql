@@ -0,0 +1,17 @@
+-- One rating per user and item, so rating writes can rely on the key instead of a prior SELECT
+
+-- Keep only the most recent of any duplicate ratings left by racing requests
+DELETE older FROM user_books_read older
+JOIN user_books_read newer ON newer.user_id = older.user_id AND newer.isbn = older.isbn AND newer.uuid > older.uuid;
+
+DELETE older FROM user_movies_watched older
+JOIN user_movies_watched newer ON newer.user_id = older.user_id AND newer.movie_id = older.movie_id AND newer.uuid > older.uuid;
+
+-- The unique keys start with user_id, so they also serve the user_id foreign keys
+ALTER TABLE user_books_read
+    ADD UNIQUE KEY uq_user_books_user_isbn (user_id, isbn),
+    DROP INDEX idx_user_books_user_id;
+
+ALTER TABLE user_movies_watched
+    ADD UNIQUE KEY uq_user_movies_user_movie (user_id, movie_id),
+    DROP INDEX idx_user_movies_user_id;
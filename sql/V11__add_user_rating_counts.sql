@@ -0,0 +1,8 @@
+-- Per-user rating counters, so onboarding progress is a single row read instead of two COUNTs
+ALTER TABLE rc_user
+    ADD COLUMN movies_rated INT NOT NULL DEFAULT 0,
+    ADD COLUMN books_rated INT NOT NULL DEFAULT 0;
+
+UPDATE rc_user u
+SET movies_rated = (SELECT COUNT(*) FROM user_movies_watched r WHERE r.user_id = u.id),
+    books_rated = (SELECT COUNT(*) FROM user_books_read r WHERE r.user_id = u.id);
@@ -0,0 +1,12 @@
+-- Precomputed per-user recommendations written by the offline batch job
+CREATE TABLE user_recommendations (
+    uuid INT PRIMARY KEY AUTO_INCREMENT,
+    email VARCHAR(120) NOT NULL,
+    rec_type VARCHAR(10) NOT NULL,
+    engine VARCHAR(10) NOT NULL,
+    history_hash CHAR(64) NOT NULL,
+    recommendations MEDIUMTEXT NOT NULL,
+    generated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (email) REFERENCES rc_user(email) ON DELETE CASCADE,
+    UNIQUE KEY uq_user_recommendations_email_type (email, rec_type)
+);
@@ -0,0 +1,5 @@
+-- Version counters behind listing ETags: 'catalog' and one 'user:<email>' row per user library
+CREATE TABLE cache_versions (
+    scope VARCHAR(150) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
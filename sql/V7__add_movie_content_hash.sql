@@ -0,0 +1,2 @@
+-- Per-row content hash used by the incremental TMDB sync to detect changed movies
+ALTER TABLE movies ADD COLUMN content_hash CHAR(32) NULL;
@@ -0,0 +1,56 @@
+-- Normalized genre and cast tables so listing filters and facet counts are index lookups
+CREATE TABLE movie_genres (
+    genre VARCHAR(100) NOT NULL,
+    movie_id INT NOT NULL,
+    PRIMARY KEY (genre, movie_id),
+    FOREIGN KEY (movie_id) REFERENCES movies(id) ON DELETE CASCADE,
+    INDEX idx_movie_genres_movie_id (movie_id)
+);
+
+CREATE TABLE movie_cast (
+    name VARCHAR(255) NOT NULL,
+    movie_id INT NOT NULL,
+    PRIMARY KEY (name, movie_id),
+    FOREIGN KEY (movie_id) REFERENCES movies(id) ON DELETE CASCADE,
+    INDEX idx_movie_cast_movie_id (movie_id)
+);
+
+-- Indexes behind the language and release year filters
+CREATE INDEX idx_movies_language ON movies (original_language);
+CREATE INDEX idx_movies_release_date ON movies (release_date);
+
+-- Populate both tables by splitting the existing comma-separated columns;
+-- each recursion step peels off one item, and cast lists can be long
+SET SESSION cte_max_recursion_depth = 10000;
+
+INSERT IGNORE INTO movie_genres (genre, movie_id)
+WITH RECURSIVE split (movie_id, item, rest) AS (
+    SELECT id,
+           TRIM(SUBSTRING_INDEX(genres, ',', 1)),
+           IF(LOCATE(',', genres) > 0, SUBSTRING(genres, LOCATE(',', genres) + 1), NULL)
+    FROM movies
+    WHERE genres IS NOT NULL AND genres <> ''
+    UNION ALL
+    SELECT movie_id,
+           TRIM(SUBSTRING_INDEX(rest, ',', 1)),
+           IF(LOCATE(',', rest) > 0, SUBSTRING(rest, LOCATE(',', rest) + 1), NULL)
+    FROM split
+    WHERE rest IS NOT NULL
+)
+SELECT LEFT(item, 100), movie_id FROM split WHERE item <> '';
+
+INSERT IGNORE INTO movie_cast (name, movie_id)
+WITH RECURSIVE split (movie_id, item, rest) AS (
+    SELECT id,
+           TRIM(SUBSTRING_INDEX(`cast`, ',', 1)),
+           IF(LOCATE(',', `cast`) > 0, SUBSTRING(`cast`, LOCATE(',', `cast`) + 1), NULL)
+    FROM movies
+    WHERE `cast` IS NOT NULL AND `cast` <> ''
+    UNION ALL
+    SELECT movie_id,
+           TRIM(SUBSTRING_INDEX(rest, ',', 1)),
+           IF(LOCATE(',', rest) > 0, SUBSTRING(rest, LOCATE(',', rest) + 1), NULL)
+    FROM split
+    WHERE rest IS NOT NULL
+)
+SELECT LEFT(item, 255), movie_id FROM split WHERE item <> '';
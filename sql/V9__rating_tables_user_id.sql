@@ -0,0 +1,28 @@
+-- Reference users from the rating tables by integer id instead of email, so rating
+-- index entries, joins and foreign key checks carry 4 bytes instead of a VARCHAR(120)
+ALTER TABLE user_books_read ADD COLUMN user_id INT NULL AFTER uuid;
+ALTER TABLE user_movies_watched ADD COLUMN user_id INT NULL AFTER uuid;
+
+UPDATE user_books_read r JOIN rc_user u ON u.email = r.email SET r.user_id = u.id;
+UPDATE user_movies_watched r JOIN rc_user u ON u.email = r.email SET r.user_id = u.id;
+
+-- Ratings of users that no longer exist (the email foreign key should have prevented these)
+DELETE FROM user_books_read WHERE user_id IS NULL;
+DELETE FROM user_movies_watched WHERE user_id IS NULL;
+
+-- The email foreign key was the first one declared on each table in V1
+ALTER TABLE user_books_read
+    DROP FOREIGN KEY user_books_read_ibfk_1,
+    DROP INDEX idx_user_books_email,
+    DROP COLUMN email,
+    MODIFY user_id INT NOT NULL,
+    ADD CONSTRAINT fk_user_books_user_id FOREIGN KEY (user_id) REFERENCES rc_user(id) ON DELETE CASCADE,
+    ADD INDEX idx_user_books_user_id (user_id);
+
+ALTER TABLE user_movies_watched
+    DROP FOREIGN KEY user_movies_watched_ibfk_1,
+    DROP INDEX idx_user_movies_email,
+    DROP COLUMN email,
+    MODIFY user_id INT NOT NULL,
+    ADD CONSTRAINT fk_user_movies_user_id FOREIGN KEY (user_id) REFERENCES rc_user(id) ON DELETE CASCADE,
+    ADD INDEX idx_user_movies_user_id (user_id);
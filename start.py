@@ -3,7 +3,15 @@ import subprocess
 import argparse
 import os
 
-def start_application(tenant_id: str, client_id: str, client_secret: str, openapi_key: str):
+def compose_command(production: bool = False):
+    """docker-compose command line, adding the production overrides when requested"""
+    command = ['docker-compose']
+    if production:
+        command += ['-f', 'docker-compose.yml', '-f', 'docker-compose.prod.yml']
+    return command + ['up', '--build']
+
+def start_application(tenant_id: str, client_id: str, client_secret: str, openapi_key: str,
+                      production: bool = False, workers: int = None, timeout: int = None):
     """Start the application using docker-compose with environment variables"""
     try:
         env = {
@@ -13,9 +21,14 @@ def start_application(tenant_id: str, client_id: str, client_secret: str, openap
             'OPENAI_API_KEY': openapi_key,
             **os.environ  # Include existing environment variables
         }
+        # Gunicorn settings read by gunicorn.conf.py in production mode
+        if workers:
+            env['WEB_CONCURRENCY'] = str(workers)
+        if timeout:
+            env['GUNICORN_TIMEOUT'] = str(timeout)
         
         subprocess.run(
-            ['docker-compose', 'up', '--build'],
+            compose_command(production),
             env=env,
             check=True
         )
@@ -32,12 +45,19 @@ def main():
     parser.add_argument('client_id', help='Microsoft Azure Client ID')
     parser.add_argument('client_secret', help='Microsoft Azure Client Secret')
     parser.add_argument('openapi_key', help='Open API Key')
+    parser.add_argument('--production', action='store_true',
+                        help='Serve with Gunicorn and gevent workers instead of the Flask development server')
+    parser.add_argument('--workers', type=int,
+                        help='Gunicorn worker processes in production mode (default: one per CPU)')
+    parser.add_argument('--timeout', type=int,
+                        help='Seconds before Gunicorn replaces an unresponsive production worker (default: 120)')
     
     args = parser.parse_args()
     
     try:
-        print("Starting application...")
-        start_application(args.tenant_id, args.client_id, args.client_secret, args.openapi_key)
+        print("Starting application in production mode..." if args.production else "Starting application...")
+        start_application(args.tenant_id, args.client_id, args.client_secret, args.openapi_key,
+                          args.production, args.workers, args.timeout)
         
     except Exception as e:
         print(f"Error: {e}")